@@ -6,6 +6,26 @@ import numpy as np
 from game.config import *
 from game.layout_loader import load_layout, save_score
 from game.rendering import render_game  
+from game.sprite_atlas import atlas
+from game.sprite_cache import SpriteCache, scaled_sizes
+
+# rotation of the agent sprite per facing, the sprite itself looks down
+AGENT_ANGLES = {"up": 180, "down": 0, "left": -90, "right": 90}
+POISON_SCALE = 0.2  # poison pulses between 1 - POISON_SCALE and 1 + POISON_SCALE of its size
+AGENT_MOVE_SCALE = (0.9, 1.1)  # agent size during the move animation
+ENEMY_MOVE_SCALE = (1.0, 1.2)  # enemy size during the move animation, it shrinks back from the larger one
+# rotation of the weapon sprite per facing, it swings SWING_ARC degrees across it and grows by up to SWING_SCALE
+WEAPON_ANGLES = {"up": 0, "down": 180, "left": 90, "right": -90}
+SWING_ARC = 60
+SWING_SCALE = 0.25
+
+
+def swing_variant(facing, progress):
+    "(angle, scale) of the weapon at progress of the swing, rounded to whole degrees and hundredths"
+    fade_in_out = 1 - abs(2 * progress - 1)  # peak at progress=0.5
+    angle = WEAPON_ANGLES[facing] - SWING_ARC * (progress - 0.5)  # swing arc centered
+    return round(angle), round(1.0 + SWING_SCALE * fade_in_out, 2)
+
 
 class GridWorldGame:
     def __init__(self, layout_path):
@@ -57,7 +77,8 @@ class GridWorldGame:
         self._init_pygame()
 
     def _init_pygame(self):
-            pygame.init()
+            if not pygame.get_init():
+                pygame.init()
             self.window = pygame.display.set_mode((self.grid_size[1] * CELL_SIZE + MARGIN * 2, self.grid_size[0] * CELL_SIZE + MARGIN * 2))
             pygame.display.set_caption("Grid World")
             self.clock = pygame.time.Clock()
@@ -70,43 +91,42 @@ class GridWorldGame:
             self.background_color = (0, 0, 0)
             
 
-            self.agent_image = pygame.image.load("game_sprites/characters/character_main_still.png").convert_alpha()
-            self.agent_image = pygame.transform.scale(self.agent_image, (AGENT_WIDTH, AGENT_HEIGHT))
-            self.enemy_image = pygame.image.load("game_sprites/characters/character_enemy.png").convert_alpha()
-            self.enemy_image = pygame.transform.scale(self.enemy_image, (64, 64))
-            self.rubble_images = [
-                pygame.transform.scale(pygame.image.load("game_sprites/enviroment/rubble_rocks.png").convert_alpha(), (64, 64)),
-                pygame.transform.scale(pygame.image.load("game_sprites/enviroment/rubble_stone.png").convert_alpha(), (64, 64)),
-                pygame.transform.scale(pygame.image.load("game_sprites/enviroment/rubble_debris.png").convert_alpha(), (64, 64)),
-                pygame.transform.scale(pygame.image.load("game_sprites/enviroment/rubble_barrel.png").convert_alpha(), (64, 64)),
-                pygame.transform.scale(pygame.image.load("game_sprites/enviroment/rubble_crate.png").convert_alpha(), (64, 64))
-            ]
-            self.wall_images = [
-                pygame.transform.scale(pygame.image.load("game_sprites/walls/wall_solid.png").convert_alpha(), (64, 64)),
-                pygame.transform.scale(pygame.image.load("game_sprites/walls/wall_cracked.png").convert_alpha(), (64, 64)),
-                pygame.transform.scale(pygame.image.load("game_sprites/walls/wall_destroyed.png").convert_alpha(), (64, 64))
-            ]
-
-            self.poison_frames = [
-                pygame.transform.scale(pygame.image.load("game_sprites/enviroment/poison/poison_1.png").convert_alpha(), (64, 64)),
-                pygame.transform.scale(pygame.image.load("game_sprites/enviroment/poison/poison_2.png").convert_alpha(), (64, 64)),
-                pygame.transform.scale(pygame.image.load("game_sprites/enviroment/poison/poison_3.png").convert_alpha(), (64, 64)),
-                pygame.transform.scale(pygame.image.load("game_sprites/enviroment/poison/poison_4.png").convert_alpha(), (64, 64))
-            ]
-
-            self.trash_images = [
-                pygame.transform.scale(pygame.image.load("game_sprites/enviroment/trash/trash_food.png").convert_alpha(), (48, 48)),
-                pygame.transform.scale(pygame.image.load("game_sprites/enviroment/trash/trash_slime.png").convert_alpha(), (48, 48)),
-                pygame.transform.scale(pygame.image.load("game_sprites/enviroment/trash/trash_cobweb.png").convert_alpha(), (48, 48)),
-                pygame.transform.scale(pygame.image.load("game_sprites/enviroment/trash/trash_skulls.png").convert_alpha(), (48, 48)),
-                pygame.transform.scale(pygame.image.load("game_sprites/enviroment/trash/trash_gold.png").convert_alpha(), (48, 48)),
-                pygame.transform.scale(pygame.image.load("game_sprites/enviroment/trash/trash_chair.png").convert_alpha(), (48, 48))
-            ]
-            self.target_image = pygame.image.load("game_sprites/enviroment/staircase_steps.png").convert_alpha()
-            self.target_image = pygame.transform.scale(self.target_image, (64, 64))
-
-            self.weapon_image = pygame.image.load("game_sprites/characters/character_broom.png").convert_alpha()
-            self.weapon_image = pygame.transform.scale(self.weapon_image, (64, 64))  
+            # subsurfaces of the atlas loaded once per process, a new level loads nothing
+            sprites = atlas((AGENT_WIDTH, AGENT_HEIGHT))
+            self.agent_image = sprites.sprite("agent")
+            self.enemy_image = sprites.sprite("enemy")
+            self.rubble_images = sprites.group("rubble")
+            self.wall_images = sprites.group("wall")
+            self.poison_frames = sprites.group("poison")
+            self.trash_images = sprites.group("trash")
+            self.target_image = sprites.sprite("target")
+            self.weapon_image = sprites.sprite("weapon")
+
+            # fixed variants are made here, drawing a frame then runs no transform
+            self.sprites = SpriteCache()  # flipped/scaled textures of walls, rubble and trash
+            self.agent_sprites = {
+                facing: pygame.transform.rotate(self.agent_image, angle) for facing, angle in AGENT_ANGLES.items()
+            }
+            self.agent_variants = {
+                (facing, size): pygame.transform.smoothscale(sprite, size)
+                for facing, sprite in self.agent_sprites.items()
+                for size in scaled_sizes(sprite, *AGENT_MOVE_SCALE)
+            }
+            self.poison_variants = {
+                (frame_id, size): pygame.transform.smoothscale(frame, size)
+                for frame_id, frame in enumerate(self.poison_frames)
+                for size in scaled_sizes(frame, 1.0 - POISON_SCALE, 1.0 + POISON_SCALE)
+            }
+            # weapon swing and enemy move animations look their sprites up by rounded angle and scale
+            swing = {swing_variant(facing, step / 1000) for facing in WEAPON_ANGLES for step in range(1001)}
+            self.weapon_variants = {
+                (angle, scale): pygame.transform.rotozoom(self.weapon_image, angle, scale) for angle, scale in swing
+            }
+            low, high = ENEMY_MOVE_SCALE
+            self.enemy_variants = {
+                scale: pygame.transform.rotozoom(self.enemy_image, 0, scale)
+                for scale in {round(low + (high - low) * step / 100, 2) for step in range(101)}
+            }
             self.last_attack_time = 0
             self.attack_display_duration = 250  
             self.agent_move_anim_start = None
@@ -204,6 +224,11 @@ class GridWorldGame:
 
         self.enemy_killed = 0
 
+        # render_game draws the static layer again for the new layout and textures
+        self.static_layer = None
+        self.drawn = []  # rects of the current frame drawn over the static layer
+        self.wobbled = []  # (sprite, position, rect) of the poison and trash of the current frame
+
 
 
 
@@ -418,17 +443,10 @@ class GridWorldGame:
         alpha = int(255 * fade_in_out)
 
         
-        swing_arc_angle = 60  # total arc rotation
         swing_distance = 50  # pixel movement forward
         swing_lift = 20       # pixel lift at the beginning
 
-        # Direction and rotation base
-        angle_map = {
-            "up": 0,
-            "down": 180,
-            "left": 90,
-            "right": -90
-        }
+        # Direction
         drc_map = {
             "up": (-1, 0),
             "down": (1, 0),
@@ -436,10 +454,6 @@ class GridWorldGame:
             "right": (0, 1)
         }
 
-        base_angle = angle_map[self.agent_facing]
-        arc_offset = -swing_arc_angle * (progress - 0.5)  # swing arc centered
-        swing_angle = base_angle + arc_offset
-
         # Forward + lift movement
         dr, dc = drc_map[self.agent_facing]
         forward_offset = swing_distance * progress
@@ -452,28 +466,28 @@ class GridWorldGame:
         offset_x = int(dc * forward_offset - dr * lift_offset)
         offset_y = int(dr * forward_offset + dc * lift_offset)
 
-        # Scaling for punch effect
-        scale = 1.0 + 0.25 * fade_in_out
-
-        # Apply transforms
-        weapon = pygame.transform.rotozoom(self.weapon_image, swing_angle, scale)
+        # Rotation along the arc and scaling for punch effect, precomputed
+        key = swing_variant(self.agent_facing, progress)
+        weapon = self.weapon_variants.get(key)
+        if weapon is None:
+            weapon = self.weapon_variants[key] = pygame.transform.rotozoom(self.weapon_image, *key)
         weapon.set_alpha(alpha)
         rect = weapon.get_rect(center=(center_x + offset_x, center_y + offset_y))
 
-        self.window.blit(weapon, rect.topleft)
+        self.drawn.append(self.window.blit(weapon, rect.topleft))
 
 
 
     def _draw_status_bar(self):
         # Draw steps
         step_text = self.font.render(f"Steps: {self.step_count}", True, (255, 255, 255))
-        self.window.blit(step_text, (MARGIN, 20))
+        self.drawn.append(self.window.blit(step_text, (MARGIN, 20)))
 
         # Draw score
         score_text = self.font.render(f"Score: {self.score}", True, (255, 255, 0))
         text_rect = score_text.get_rect()
         text_rect.topright = (self.window.get_width() - MARGIN, 20)
-        self.window.blit(score_text, text_rect)
+        self.drawn.append(self.window.blit(score_text, text_rect))
 
     def _draw_danger_tile(self, pos):
         x = MARGIN + pos[1] * CELL_SIZE
@@ -483,7 +497,7 @@ class GridWorldGame:
        
         surface = pygame.Surface((CELL_SIZE, CELL_SIZE), pygame.SRCALPHA)
         surface.fill((255, 0, 0, 100))  
-        self.window.blit(surface, (x, y))
+        self.drawn.append(self.window.blit(surface, (x, y)))
 
         
         pygame.draw.rect(self.window, (255, 0, 0), danger_rect, 3)
@@ -502,7 +516,7 @@ class GridWorldGame:
         pygame.draw.rect(surface, outline_color, surface.get_rect(), border_width)
 
         
-        self.window.blit(surface, (x, y))
+        self.drawn.append(self.window.blit(surface, (x, y)))
 
 
     def _draw_enemy(self, pos):
@@ -516,17 +530,18 @@ class GridWorldGame:
             elapsed = now - start_time
             if elapsed < duration:
                 progress = elapsed / duration
-                scale = 1.2 - 0.2 * progress  # grows then shrinks
+                low, high = ENEMY_MOVE_SCALE
+                scale = high - (high - low) * progress  # grows then shrinks
                 min_alpha = 150  
                 alpha_range = 255 - min_alpha
                 alpha = int(min_alpha + alpha_range * (1 - abs(progress - 0.5) * 2))
-                sprite = pygame.transform.rotozoom(sprite, 0, scale)
+                sprite = self.enemy_variants[round(scale, 2)]
                 sprite.set_alpha(alpha)
             else:
                 del self.enemy_move_animations[pos]  
 
         rect = sprite.get_rect(center=(base_x + CELL_SIZE // 2, base_y + CELL_SIZE // 2))
-        self.window.blit(sprite, rect.topleft)
+        self.drawn.append(self.window.blit(sprite, rect.topleft))
 
 
 
@@ -557,7 +572,6 @@ class GridWorldGame:
         img_rect = texture.get_rect()
 
         size = self.trash_sizes.get(pos, (64, 64))
-        texture = pygame.transform.smoothscale(texture, size)
         center_x = base_x + (CELL_SIZE - img_rect.width) // 2
         center_y = base_y + (CELL_SIZE - img_rect.height) // 2
 
@@ -567,9 +581,11 @@ class GridWorldGame:
 
         flip_x, flip_y = self.trash_rotations.get(pos, (False, False))
 
-        texture = pygame.transform.flip(texture, flip_x, flip_y)
+        texture = self.sprites.get(("trash", texture_id), texture, flip_x, flip_y, size)
 
-        self.window.blit(texture, (final_x, final_y))
+        rect = self.window.blit(texture, (final_x, final_y))
+        self.drawn.append(rect)
+        self.wobbled.append((texture, (final_x, final_y), rect))
 
 
     def _draw_poison(self, pos):
@@ -580,7 +596,7 @@ class GridWorldGame:
         t = pygame.time.get_ticks() / 1000
         offset_x = int(2 * np.sin(t + pos[0]))
         offset_y = int(8 * np.cos(t + pos[1]))
-        scale_factor = 1.0 + 0.2 * np.sin(t * 2 + pos[0] + pos[1])
+        scale_factor = 1.0 + POISON_SCALE * np.sin(t * 2 + pos[0] + pos[1])
 
         
         frame_id = self.poison_frame_order[self.poison_frame_index]
@@ -589,13 +605,15 @@ class GridWorldGame:
         
         original_size = frame.get_size()
         new_size = (int(original_size[0] * scale_factor), int(original_size[1] * scale_factor))
-        frame = pygame.transform.smoothscale(frame, new_size)
+        frame = self.poison_variants.get((frame_id, new_size)) or self.sprites.get(("poison", frame_id), frame, size=new_size)
 
        
         draw_x = base_x + (CELL_SIZE - new_size[0]) // 2 + offset_x
         draw_y = base_y + (CELL_SIZE - new_size[1]) // 2 + offset_y
 
-        self.window.blit(frame, (draw_x, draw_y))
+        rect = self.window.blit(frame, (draw_x, draw_y))
+        self.drawn.append(rect)
+        self.wobbled.append((frame, (draw_x, draw_y), rect))
 
 
 
@@ -620,7 +638,7 @@ class GridWorldGame:
 
         flip_x, flip_y = self.rubble_rotations.get(pos, (False, False))
 
-        texture = pygame.transform.flip(texture, flip_x, flip_y)
+        texture = self.sprites.get(("rubble", texture_id), texture, flip_x, flip_y)
 
         self.window.blit(texture, (center_x, center_y))
 
@@ -672,7 +690,7 @@ class GridWorldGame:
 
         flip_x, flip_y = self.wall_rotations.get(pos, (False, False))
 
-        texture = pygame.transform.flip(texture, flip_x, flip_y)
+        texture = self.sprites.get(("wall", texture_id), texture, flip_x, flip_y)
 
         self.window.blit(texture, (center_x, center_y))
 
@@ -694,25 +712,13 @@ class GridWorldGame:
                 alpha = int(150 + 105 * progress) if progress < 0.5 else int(255 - 105 * (progress - 0.5) * 2)
 
         
-        sprite = self.agent_image
-
-        if self.agent_facing == "down":
-            angle = 0
-        elif self.agent_facing == "left":
-            angle = -90
-        elif self.agent_facing == "up":
-            angle = 180
-        elif self.agent_facing == "right":
-            angle = 90
-        else:
-            angle = 0
-
-        sprite = pygame.transform.rotate(sprite, angle)
-
-        
-        original_size = sprite.get_size()
+        facing = self.agent_facing if self.agent_facing in AGENT_ANGLES else "down"
+        original_size = self.agent_sprites[facing].get_size()
         new_size = (int(original_size[0] * scale), int(original_size[1] * scale))
-        sprite = pygame.transform.smoothscale(sprite, new_size)
+        # every variant is its own surface, set_alpha below changes no shared texture
+        sprite = self.agent_variants.get((facing, new_size))
+        if sprite is None:
+            sprite = pygame.transform.smoothscale(self.agent_sprites[facing], new_size)
 
         sprite.set_alpha(alpha)
 
@@ -721,4 +727,4 @@ class GridWorldGame:
         x = MARGIN + self.agent_pos[1] * CELL_SIZE + (CELL_SIZE - rect.width) // 2
         y = MARGIN + self.agent_pos[0] * CELL_SIZE + (CELL_SIZE - rect.height) // 2
 
-        self.window.blit(sprite, (x, y))
\ No newline at end of file
+        self.drawn.append(self.window.blit(sprite, (x, y)))
\ No newline at end of file
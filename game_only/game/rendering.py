@@ -21,15 +21,32 @@ def render_game(game):
         game.poison_frame_index = (game.poison_frame_index + 1) % len(game.poison_frame_order)
         game._last_poison_tick = now
 
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            pygame.quit()
-            exit()
-
-
-    game.window.fill(game.background_color)
-    game._draw_base_tiles()
-    game._draw_grid()
+    # events, window closing included, are handled by the game loop in main.py
+
+    if game.static_layer is None:
+        # floor, grid, goal, walls and rubble don't change during a level, they are drawn once
+        game.window.fill(game.background_color)
+        game._draw_base_tiles()
+        game._draw_grid()
+        # every cell has the same floor, cells are rebuilt from it in _cover_static_tiles
+        game.floor_tile = game.window.subsurface((MARGIN, MARGIN, CELL_SIZE, CELL_SIZE)).copy()
+        game._draw_target_tile(game.WIN_TILE)
+
+        for tile in game.WALL_TILES:
+            game._draw_wall(tile)
+
+        for tile in game.RUBBLE_TILES:
+            game._draw_rubble(tile)
+
+        game.static_layer = game.window.copy()
+        changed = None
+    else:
+        # the window still holds the last frame, only what it drew over the static layer is taken back
+        changed = game.drawn
+        for rect in changed:
+            game.window.blit(game.static_layer, rect, rect)
+    game.drawn = []
+    game.wobbled = []
 
     for tile in game.DMG_TILES:
         game._draw_poison(tile)
@@ -37,13 +54,7 @@ def render_game(game):
     for tile in game.REWARD_TILES:
         game._draw_trash(tile)
 
-    game._draw_target_tile(game.WIN_TILE)
-
-    for tile in game.WALL_TILES:
-        game._draw_wall(tile)
-
-    for tile in game.RUBBLE_TILES:
-        game._draw_rubble(tile)
+    _cover_static_tiles(game)
 
     for pos in game.ENEMY_POSITIONS:
         game._draw_enemy(pos)
@@ -58,5 +69,36 @@ def render_game(game):
     game._draw_agent()
     game._draw_status_bar()
 
-    pygame.display.flip()
+    # only the rects that changed since the last frame go to the screen, all of it after a new static layer
+    if changed is None:
+        pygame.display.flip()
+    else:
+        pygame.display.update(changed + game.drawn)
     game.clock.tick(FPS)
+
+
+def _cover_static_tiles(game):
+    # poison and trash reach into neighbouring cells, but walls, rubble and the goal lie over them.
+    # Such a cell is rebuilt in that order: floor, the sprites reaching into it, its tile
+    cells = set()
+    for _, _, rect in game.wobbled:
+        for row in range((rect.top - MARGIN) // CELL_SIZE, (rect.bottom - 1 - MARGIN) // CELL_SIZE + 1):
+            for col in range((rect.left - MARGIN) // CELL_SIZE, (rect.right - 1 - MARGIN) // CELL_SIZE + 1):
+                cells.add((row, col))
+    for pos in cells:
+        if pos == game.WIN_TILE:
+            draw_tile = game._draw_target_tile
+        elif pos in game.wall_textures_id:
+            draw_tile = game._draw_wall
+        elif pos in game.rubble_textures_id:
+            draw_tile = game._draw_rubble
+        else:
+            continue
+        cell = pygame.Rect(MARGIN + pos[1] * CELL_SIZE, MARGIN + pos[0] * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+        game.window.set_clip(cell)
+        game.window.blit(game.floor_tile, cell)
+        for sprite, dest, rect in game.wobbled:
+            if rect.colliderect(cell):
+                game.window.blit(sprite, dest)
+        draw_tile(pos)
+    game.window.set_clip(None)
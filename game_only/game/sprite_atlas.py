@@ -0,0 +1,92 @@
+# The same file is in gymnasium_env/env/ and game_only/game/. The two trees are installed, run and
+# packaged on their own and cannot import from each other, so keep both copies identical.
+import os
+
+import pygame
+
+SPRITE_DIR = "game_sprites"
+ATLAS_WIDTH = 512
+
+# the agent is scaled to the size in the config of the tree, it is passed in
+AGENT_SPRITE = "characters/character_main_still.png"
+
+# name -> (png in SPRITE_DIR, size it is scaled to)
+SPRITES = {
+    "enemy": ("characters/character_enemy.png", (64, 64)),
+    "weapon": ("characters/character_broom.png", (64, 64)),
+    "target": ("enviroment/staircase_steps.png", (64, 64)),
+    "rubble_rocks": ("enviroment/rubble_rocks.png", (64, 64)),
+    "rubble_stone": ("enviroment/rubble_stone.png", (64, 64)),
+    "rubble_debris": ("enviroment/rubble_debris.png", (64, 64)),
+    "rubble_barrel": ("enviroment/rubble_barrel.png", (64, 64)),
+    "rubble_crate": ("enviroment/rubble_crate.png", (64, 64)),
+    "wall_solid": ("walls/wall_solid.png", (64, 64)),
+    "wall_cracked": ("walls/wall_cracked.png", (64, 64)),
+    "wall_destroyed": ("walls/wall_destroyed.png", (64, 64)),
+    "poison_1": ("enviroment/poison/poison_1.png", (64, 64)),
+    "poison_2": ("enviroment/poison/poison_2.png", (64, 64)),
+    "poison_3": ("enviroment/poison/poison_3.png", (64, 64)),
+    "poison_4": ("enviroment/poison/poison_4.png", (64, 64)),
+    "trash_food": ("enviroment/trash/trash_food.png", (48, 48)),
+    "trash_slime": ("enviroment/trash/trash_slime.png", (48, 48)),
+    "trash_cobweb": ("enviroment/trash/trash_cobweb.png", (48, 48)),
+    "trash_skulls": ("enviroment/trash/trash_skulls.png", (48, 48)),
+    "trash_gold": ("enviroment/trash/trash_gold.png", (48, 48)),
+    "trash_chair": ("enviroment/trash/trash_chair.png", (48, 48)),
+}
+
+# texture variants in the order of the texture ids (wall_textures_id, trash_textures_id, ...)
+GROUPS = {
+    "rubble": ["rubble_rocks", "rubble_stone", "rubble_debris", "rubble_barrel", "rubble_crate"],
+    "wall": ["wall_solid", "wall_cracked", "wall_destroyed"],
+    "poison": ["poison_1", "poison_2", "poison_3", "poison_4"],
+    "trash": ["trash_food", "trash_slime", "trash_cobweb", "trash_skulls", "trash_gold", "trash_chair"],
+}
+
+
+class SpriteAtlas:
+    """All sprites scaled once and packed into one surface, handed out as subsurfaces.
+
+    Sprites are placed in rows of width pixels, tallest first, rects maps a
+    sprite name to its place in surface. convert_alpha needs a display mode,
+    so the atlas can only be built after pygame.display.set_mode.
+    """
+
+    def __init__(self, agent_size, sprites=SPRITES, directory=SPRITE_DIR, width=ATLAS_WIDTH):
+        sprites = {"agent": (AGENT_SPRITE, agent_size), **sprites}
+        images = {
+            name: pygame.transform.scale(pygame.image.load(os.path.join(directory, path)).convert_alpha(), size)
+            for name, (path, size) in sprites.items()
+        }
+        self.rects = {}
+        x = y = row_height = 0
+        for name in sorted(images, key=lambda name: -images[name].get_height()):
+            w, h = images[name].get_size()
+            if x + w > width:
+                x, y, row_height = 0, y + row_height, 0
+            self.rects[name] = pygame.Rect(x, y, w, h)
+            x += w
+            row_height = max(row_height, h)
+
+        self.surface = pygame.Surface((width, y + row_height), pygame.SRCALPHA).convert_alpha()
+        self.surface.fill((0, 0, 0, 0))
+        for name, image in images.items():
+            # max onto the transparent atlas copies the pixels as they are, a plain blit would blend them
+            self.surface.blit(image, self.rects[name], special_flags=pygame.BLEND_RGBA_MAX)
+        self._sprites = {name: self.surface.subsurface(rect) for name, rect in self.rects.items()}
+
+    def sprite(self, name):
+        return self._sprites[name]
+
+    def group(self, name):
+        return [self._sprites[sprite] for sprite in GROUPS[name]]
+
+
+_atlases = {}
+
+
+def atlas(agent_size):
+    "the SpriteAtlas of this process, loaded on first use and kept across renderers, levels and pygame.quit()"
+    if agent_size not in _atlases:
+        _atlases[agent_size] = SpriteAtlas(agent_size)
+    return _atlases[agent_size]
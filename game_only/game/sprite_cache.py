@@ -0,0 +1,53 @@
+# The same file is in gymnasium_env/env/ and game_only/game/. The two trees are installed, run and
+# packaged on their own and cannot import from each other, so keep both copies identical.
+from collections import OrderedDict
+
+import pygame
+
+
+class SpriteCache:
+    """Flipped, scaled and rotated variants of textures, each made only once.
+
+    A variant is keyed by (texture id, flip_x, flip_y, size, angle) and built
+    from the texture by smoothscale to size, flip and rotate, in this order.
+    Beyond max_size variants the least recently used one is dropped.
+    """
+
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self._variants = OrderedDict()
+
+    def __len__(self):
+        return len(self._variants)
+
+    def get(self, texture_id, texture, flip_x=False, flip_y=False, size=None, angle=0):
+        "the variant of texture, texture_id has to name texture uniquely, e.g. ('wall', 2)"
+        key = (texture_id, flip_x, flip_y, size, angle)
+        variant = self._variants.get(key)
+        if variant is not None:
+            self._variants.move_to_end(key)
+            return variant
+        variant = texture
+        if size is not None and size != texture.get_size():
+            variant = pygame.transform.smoothscale(variant, size)
+        if flip_x or flip_y:
+            variant = pygame.transform.flip(variant, flip_x, flip_y)
+        if angle:
+            variant = pygame.transform.rotate(variant, angle)
+        self._variants[key] = variant
+        if len(self._variants) > self.max_size:
+            self._variants.popitem(last=False)
+        return variant
+
+    def clear(self):
+        self._variants.clear()
+
+
+def scaled_sizes(texture, low, high):
+    "every (width, height) int(side * scale) gives for a scale in [low, high]"
+    width, height = texture.get_size()
+    sizes = set()
+    for step in range(1001):
+        scale = low + (high - low) * step / 1000
+        sizes.add((int(width * scale), int(height * scale)))
+    return sorted(sizes)
@@ -0,0 +1,230 @@
+"""Throughput benchmark of GridWorldEnv.
+
+Measures steps/sec, resets/sec and p50/p99 step latency with random actions for
+every layout in level_layouts/ and for synthetic square grids, each with high and
+low level actions and with/without enemies. Results are written as JSON and can be
+compared against a saved baseline run:
+
+    python benchmark.py --output bench.json
+    python benchmark.py --baseline bench.json --tolerance 0.1
+
+With --recorder every case also runs wrapped in a TrajectoryRecorder writing to
+a temporary directory and the step overhead of recording is printed. The plain
+and the recorded env step in turns within one run, so load on the machine hits
+both alike:
+
+    python benchmark.py --recorder --sizes 32 128
+
+With --baseline the exit code is 1 when any case got slower than the tolerance.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from env import GridWorldEnv
+from env.recorder import TrajectoryRecorder
+
+LAYOUT_DIR = "level_layouts"
+SYNTHETIC_SIZES = [5, 8, 16, 32, 64, 128, 256]
+
+
+def strip_enemies(lines):
+    "the layout without enemies, the rest of the workload stays"
+    # 'M' is always an enemy and is left empty. 'A' may become one, so it is fixed to a reward or poison
+    # instead, two rewards per poison like the draws in layout_loader.RANDOM_TILE_WEIGHTS
+    random_tiles = 0
+    stripped = []
+    for line in lines:
+        row = []
+        for symbol in line:
+            if symbol == "M":
+                symbol = "."
+            elif symbol == "A":
+                symbol = "R" if random_tiles % 3 == 2 else "B"
+                random_tiles += 1
+            row.append(symbol)
+        stripped.append("".join(row))
+    return stripped
+
+
+def synthetic_layout(size, seed=0):
+    "square layout with a wall border, random walls/rubble/random tiles, starts on the left and the goal on the right"
+    rng = np.random.default_rng(seed)
+    grid = np.full((size, size), ".")
+    grid[0, :] = grid[-1, :] = grid[:, 0] = grid[:, -1] = "#"
+
+    inner = grid[1:-1, 1:-1]
+    roll = rng.random(inner.shape)
+    inner[roll < 0.12] = "#"
+    inner[(roll >= 0.12) & (roll < 0.16)] = "E"
+    inner[(roll >= 0.16) & (roll < 0.22)] = "A"
+    inner[(roll >= 0.22) & (roll < 0.23)] = "M"
+
+    rows = np.linspace(1, size - 2, num=min(4, size - 2), dtype=int)
+    grid[rows, 1] = "S"
+    grid[size // 2, size - 2] = "G"
+    return ["".join(row) for row in grid]
+
+
+def write_layout(directory, name, lines):
+    path = os.path.join(directory, name + ".txt")
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def build_cases(tmp_dir, sizes):
+    "(case name, layout path) for every layout and synthetic grid, with and without enemies"
+    cases = []
+    for file_name in sorted(os.listdir(LAYOUT_DIR)):
+        path = os.path.join(LAYOUT_DIR, file_name)
+        name = os.path.splitext(file_name)[0]
+        with open(path) as f:
+            lines = [line.strip() for line in f if line.strip()]
+        cases.append((name + "/enemies", path))
+        cases.append((name + "/no_enemies", write_layout(tmp_dir, name + "_no_enemies", strip_enemies(lines))))
+
+    for size in sizes:
+        lines = synthetic_layout(size)
+        name = f"synthetic_{size}x{size}"
+        cases.append((name + "/enemies", write_layout(tmp_dir, name, lines)))
+        cases.append((name + "/no_enemies", write_layout(tmp_dir, name + "_no_enemies", strip_enemies(lines))))
+    return cases
+
+
+def run_case(layout_path, low_level, seconds, max_steps, resets, seed=0, record_dir=None):
+    "results of the plain env, with record_dir followed by those of a recorded env stepped in lockstep with it"
+    envs = [GridWorldEnv(layout_path, render_mode="rgb_array")]
+    if record_dir is not None:
+        envs.append(TrajectoryRecorder(GridWorldEnv(layout_path, render_mode="rgb_array"), record_dir))
+    actions = np.random.default_rng(seed).integers(0, 5, size=max_steps).tolist()
+    latencies = np.zeros((len(envs), max_steps), dtype=np.int64)
+    reset_ns = []
+    order = [range(len(envs)), range(len(envs) - 1, -1, -1)]
+    clock = time.perf_counter_ns
+
+    # the env prints on curriculum progress, which is not what is measured here
+    with contextlib.redirect_stdout(io.StringIO()):
+        for env in envs:
+            env.reset(seed=seed, use_low_level_actions=low_level)
+        deadline = clock() + int(seconds * 1e9)
+        steps = 0
+        while steps < max_steps and clock() < deadline:
+            # same seed and actions, both envs go through the same episodes. The env stepped second runs
+            # on warm caches, so the order flips every step
+            for i in order[steps % 2]:
+                start = clock()
+                _, _, terminated, truncated, _ = envs[i].step(actions[steps])
+                latencies[i, steps] = clock() - start
+                if terminated or truncated:
+                    envs[i].reset()
+            steps += 1
+
+        for env in envs:
+            start = clock()
+            for _ in range(resets):
+                env.reset()
+            reset_ns.append(clock() - start)
+    for env in envs:
+        env.close()
+
+    return [
+        {
+            "steps": steps,
+            "steps_per_sec": steps / (env_latencies[:steps].sum() / 1e9),
+            "step_p50_us": float(np.percentile(env_latencies[:steps], 50)) / 1e3,
+            "step_p99_us": float(np.percentile(env_latencies[:steps], 99)) / 1e3,
+            "resets": resets,
+            "resets_per_sec": resets / (env_reset_ns / 1e9),
+        }
+        for env_latencies, env_reset_ns in zip(latencies, reset_ns)
+    ]
+
+
+def print_result(case, result, suffix=""):
+    print(
+        f"{case:45s} {result['steps_per_sec']:10.1f} steps/s  {result['resets_per_sec']:8.1f} resets/s  "
+        f"p50 {result['step_p50_us']:8.1f} us  p99 {result['step_p99_us']:8.1f} us{suffix}"
+    )
+
+
+def compare(results, baseline, tolerance):
+    "prints the change of every case found in both runs, returns the names of the regressed ones"
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        for key in ("steps_per_sec", "resets_per_sec"):
+            ratio = result[key] / old[key]
+            marker = ""
+            if ratio < 1 - tolerance:
+                marker = "  REGRESSION"
+                regressions.append(f"{name} {key}")
+            print(f"{name:45s} {key:15s} {old[key]:12.1f} -> {result[key]:12.1f} ({ratio:6.2f}x){marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the results")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative slowdown before a case counts as regressed")
+    parser.add_argument("--seconds", type=float, default=1.0, help="time budget for the steps of one case")
+    parser.add_argument("--max-steps", type=int, default=20000, help="step limit of one case")
+    parser.add_argument("--resets", type=int, default=50, help="resets timed per case")
+    parser.add_argument("--sizes", type=int, nargs="*", default=SYNTHETIC_SIZES, help="synthetic grid sizes")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this text")
+    parser.add_argument("--recorder", action="store_true", help="also run every case with a TrajectoryRecorder")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, layout_path in build_cases(tmp_dir, args.sizes):
+            for low_level in (False, True):
+                case = f"{name}/{'low' if low_level else 'high'}_level"
+                if args.filter not in case:
+                    continue
+                record_dir = os.path.join(tmp_dir, "recording", case.replace("/", "_")) if args.recorder else None
+                result, *recorded = run_case(layout_path, low_level, args.seconds, args.max_steps, args.resets, record_dir=record_dir)
+                results[case] = result
+                print_result(case, result)
+                if recorded:
+                    # only env.step() is timed, so the final flush in close() is not counted
+                    recorded = results[case + "/recorder"] = recorded[0]
+                    recorded["overhead"] = result["steps_per_sec"] / recorded["steps_per_sec"] - 1
+                    print_result(case + "/recorder", recorded, f"  overhead {recorded['overhead']:+.1%}")
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regressions over {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
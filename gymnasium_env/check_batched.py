@@ -0,0 +1,106 @@
+"""Checks that BatchedGridWorldEnv steps exactly like GridWorldEnv under the same seeds.
+
+Env i of the batch is compared with a GridWorldEnv reset with seed + i, both
+get the same random low level actions. Every step the observation, reward,
+terminated/truncated, info["result"] and the action mask have to match, the
+final observation too when an episode ends. Checks all layouts in
+level_layouts/ by default, --generated adds generated maps with many enemies:
+
+    python check_batched.py
+    python check_batched.py level_layouts/level_arena.txt --steps 5000
+    python check_batched.py --generated 2 --generated-enemies 200
+
+The exit code is 1 at the first mismatch.
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from env import BatchedGridWorldEnv, GridWorldEnv
+from env.layout_generator import generate_layout, save_layout
+
+LAYOUT_DIR = "level_layouts"
+
+
+def compare(layout_path, num_envs=4, steps=2000, seed=0, reset_kwargs=None):
+    "steps of the batch and of num_envs scalar envs side by side, returns None or a description of the first mismatch"
+    reset_kwargs = {**(reset_kwargs or {}), "use_low_level_actions": True}
+    batched = BatchedGridWorldEnv(layout_path, num_envs)
+    scalar = [GridWorldEnv(layout_path, render_mode="rgb_array") for _ in range(num_envs)]
+    actions_rng = np.random.default_rng(seed)
+
+    # both envs print progress messages, they are not part of the check
+    with contextlib.redirect_stdout(io.StringIO()):
+        obs, _ = batched.reset(seed=seed, options=reset_kwargs)
+        scalar_obs = [env.reset(seed=seed + i, **reset_kwargs)[0] for i, env in enumerate(scalar)]
+        if not np.array_equal(obs, np.stack(scalar_obs)):
+            return "observations differ after reset"
+
+        for t in range(steps):
+            actions = actions_rng.integers(0, 5, num_envs)
+            obs, rewards, terminated, truncated, infos = batched.step(actions)
+            for i, env in enumerate(scalar):
+                env_obs, reward, env_terminated, env_truncated, info = env.step(int(actions[i]))
+                where = f"step {t}, env {i}"
+                result = infos["result"][i] if "result" in infos and infos["_result"][i] else None
+                if info.get("result") != result:
+                    return f"{where}: result {info.get('result')!r} != {result!r}"
+                if reward != rewards[i]:
+                    return f"{where}: reward {reward} != {rewards[i]}"
+                if (env_terminated, env_truncated) != (terminated[i], truncated[i]):
+                    return f"{where}: terminated/truncated {(env_terminated, env_truncated)} != {(terminated[i], truncated[i])}"
+                if env_terminated or env_truncated:
+                    if not np.array_equal(env_obs, infos["final_obs"][i]):
+                        return f"{where}: final observations differ"
+                    env_obs, info = env.reset(**reset_kwargs)
+                if not np.array_equal(env_obs, obs[i]):
+                    return f"{where}: observations differ"
+                if not np.array_equal(info["action_mask"], infos["action_mask"][i]):
+                    return f"{where}: action mask {info['action_mask']} != {infos['action_mask'][i]}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("layouts", nargs="*", help=f"layout files, all of {LAYOUT_DIR}/ by default")
+    parser.add_argument("--envs", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--test-emptiness", type=float, default=None, help="reset option for random tiles")
+    parser.add_argument("--generated", type=int, default=0, help="number of generated maps to check in addition")
+    parser.add_argument("--generated-size", type=int, default=64)
+    parser.add_argument("--generated-enemies", type=int, default=200)
+    args = parser.parse_args()
+
+    layouts = args.layouts or [os.path.join(LAYOUT_DIR, name) for name in sorted(os.listdir(LAYOUT_DIR))]
+    reset_kwargs = {}
+    if args.test_emptiness is not None:
+        reset_kwargs["test_emptiness"] = args.test_emptiness
+
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        rng = np.random.default_rng(args.seed)
+        for i in range(args.generated):
+            layout = generate_layout(
+                args.generated_size, wall_density=0.15, rubble=args.generated_size, poison=args.generated_size // 2,
+                rewards=args.generated_size, enemies=args.generated_enemies, random_tiles=args.generated_size, rng=rng,
+            )
+            layouts.append(os.path.join(directory, f"generated_{i}.txt"))
+            save_layout(layouts[-1], layout)
+
+        for layout_path in layouts:
+            mismatch = compare(layout_path, args.envs, args.steps, args.seed, reset_kwargs)
+            print(f"{os.path.basename(layout_path):32s} {mismatch or 'ok'}")
+            failed = failed or mismatch is not None
+            if mismatch is not None:
+                break
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,2 @@
-from .base_env import GridWorldEnv
\ No newline at end of file
+from .base_env import GridWorldEnv
+from .batched_env import BatchedGridWorldEnv
@@ -1,24 +1,49 @@
+import time
+
 from gymnasium import Env, spaces
 import numpy as np
-import random
-from collections import deque
 
 from config import FPS, RUBBLE_TYPE_AMOUNT, WALL_TYPE_AMOUNT, TRASH_TYPE_AMOUNT
-from .layout_loader import load_layout, get_tile_type, parse_layout
+from .layout_loader import compile_layout, materialize_layout
+from .occupancy import (
+    WALL, RUBBLE, POISON, REWARD, ENEMY, DANGER, GOAL,
+    AGENT_BLOCKERS, PATH_BLOCKERS, ENEMY_BLOCKERS, OBS_LUT,
+    tiles_with
+)
+from .routing import DistanceField
+from .curriculum import Curriculum
+from .enemies import DIRECTIONS, telegraph_moves
 from .rendering import GridWorldRenderer
 
+FACINGS = ["up", "down", "left", "right"]
+
+# Profiled step phases and the methods timed for them, the times are inclusive
+# (step contains the others, move contains enemy_step, obs and the field updates)
+PERF_PHASES = {
+    "step": "step",
+    "enemy_step": "enemy_step",
+    "pathfinding": "_path_direction",
+    "move": "_step_low_level",
+    "obs": "_get_obs",
+}
 
 
 class GridWorldEnv(Env):
-    metadata = {"render_modes": ["human"], "render_fps": FPS}
+    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": FPS}
 
-    def __init__(self, layout_path):
+    def __init__(
+        self, layout_path, copy_obs=False, render_mode="human", profile=False, profile_info=False,
+        loop_window=30, loop_max_unique=4, curriculum=None
+    ):
         super().__init__()
+        assert render_mode in self.metadata["render_modes"], f"Unsupported render_mode {render_mode}"
+        self.render_mode = render_mode
 
-        self.grid = load_layout(layout_path)
-        rows, cols = len(self.grid), len(self.grid[0])
-        assert all(len(row) == cols for row in self.grid), "Layout must be rectangular"
-        self.grid_size = (rows, cols)
+        # Layout is compiled once per file, each reset only draws its random tiles
+        self.layout_path = layout_path
+        self.layout = compile_layout(layout_path)
+        self.grid = self.layout["grid"]
+        self.grid_size = rows, cols = self.layout["grid_size"]
 
         # spaces discrete 5 (5 actions)
         self.action_space = spaces.Discrete(5)
@@ -37,8 +62,17 @@ class GridWorldEnv(Env):
         self.wall_hit_count = 0
         self.hit_reset_count = 0
         self.collected_reward_count = 0
-        self.recent_positions = []
-        self.DANGER_TILES = []
+
+        # Loop detection: the last loop_window agent cells in a ring buffer plus visit counts per
+        # cell, so the number of distinct cells in the window is known without scanning it.
+        # A full window with at most loop_max_unique distinct cells ends the episode
+        self.loop_window = loop_window
+        self.loop_max_unique = loop_max_unique
+        self._recent_cells = [0] * loop_window
+        self._recent_head = 0
+        self._recent_len = 0
+        self._recent_unique = 0
+        self._visit_counts = [0] * (rows * cols)
 
         # Randomization state
         self.rubble_offsets = {} 
@@ -56,68 +90,161 @@ class GridWorldEnv(Env):
 
         self.agent_facing = "down"
 
-        self.curriculum_level = 0
-        self.episode_successes = 0
+        # progress counters, a SharedCurriculum lets parallel workers advance one curriculum together
+        self.curriculum = curriculum if curriculum is not None else Curriculum()
         self.penalized_danger_tiles = set()
         self.map_emptiness = 0.8
 
         self.attack_highlight = []
         self.use_low_level_actions = False
         self.default_omit_step_penalty = False
+
+        # Observation buffer is kept encoded and updated only where cells change,
+        # copy_obs=True returns a copy instead of the live buffer
+        self.copy_obs = copy_obs
+        self._obs = None
+
+        # Opt-in profiling: with profile=True the phase methods are wrapped on this
+        # instance only, so a disabled env runs the plain methods
+        self.profile = profile
+        self._perf_time_ns = dict.fromkeys(PERF_PHASES, 0)
+        self._perf_calls = dict.fromkeys(PERF_PHASES, 0)
+        self._perf_expansions = 0
+        if profile:
+            self._install_profiling(profile_info)
+
+        # All randomness comes from self.np_random (seeded by reset(seed=...))
         self._load_layout_state()
 
+        # Walls, rubble and the goal never change, so the distance to the goal is
+        # computed once per layout and each reset only patches it around poison
+        self._static_goal_field = DistanceField((self.cells & AGENT_BLOCKERS) == 0)
+        if self.WIN_TILE is not None:
+            self._static_goal_field.set_sources([self.WIN_TILE])
+        self._goal_field = self._static_goal_field
+
+        # Fixed size record of the dynamic game state, see get_state/set_state
+        max_enemies = self.layout["max_enemies"]
+        self.state_dtype = np.dtype([
+            ("agent_pos", np.int16, 2),
+            ("agent_facing", np.int8),
+            ("omit_step_penalty", np.bool_),
+            ("use_low_level_actions", np.bool_),
+            ("counters", np.int32, 6),
+            ("cells", np.uint8, self.grid_size),
+            ("enemy_count", np.int16),
+            ("enemy_pos", np.int16, (max_enemies, 2)),
+            ("has_enemy_targets", np.bool_),
+            ("enemy_targets", np.int16, (max_enemies, 2)),
+            ("enemy_field_stale", np.bool_),
+            ("danger_count", np.int16),
+            ("danger_pos", np.int16, (max_enemies, 2)),
+            # loop window ring buffer as it is kept in _recent_cells, and its head, length and distinct cells
+            ("recent_cells", np.int32, loop_window),
+            ("recent_window", np.int16, 3),
+            ("attack_count", np.int8),
+            ("attack_highlight", np.int16, (2, 2)),
+            ("rng_state", np.uint64, 4),
+            ("rng_has_uint32", np.bool_),
+            ("rng_uinteger", np.uint32),
+        ])
+
     def _load_layout_state(self):
-        layout_data = parse_layout(self.grid, self.episode_successes, self.map_emptiness)
-
-        self.WALL_TILES = layout_data["WALL_TILES"]
-        self.START_POSITIONS = layout_data["START_POSITIONS"]
-        self.WIN_TILE = layout_data["WIN_TILE"]
-        self.DMG_TILES = layout_data["DMG_TILES"]
-        self.REWARD_TILES = layout_data["REWARD_TILES"]
-        self.RUBBLE_TILES = layout_data["RUBBLE_TILES"]
-        self.ENEMY_POSITIONS = layout_data["ENEMY_POSITIONS"]
-        self.map_emptiness = layout_data["map_emptiness"]
-
-            
-    def _get_obs(self):
-        rows, cols = self.grid_size
-        grid = np.zeros((rows, cols), dtype=np.float32)
-
-        for r in range(rows):
-            for c in range(cols):
-                pos = (r, c)
-                if pos == tuple(self.agent_pos):
-                    grid[r, c] = 1.0  # agent
-                elif pos == self.WIN_TILE:
-                    grid[r, c] = 2.0  # goal
-                elif pos in self.DMG_TILES:
-                    grid[r, c] = 3.0  # reset
-                elif pos in self.REWARD_TILES:
-                    grid[r, c] = 4.0  # bonus
-                elif pos in self.WALL_TILES:
-                    grid[r, c] = 5.0  # wall
-                elif pos in self.RUBBLE_TILES:
-                    grid[r, c] = 6.0  # rubble
-                elif pos in self.ENEMY_POSITIONS:
-                    grid[r, c] = 7.0  # enemy
-                elif pos in self.DANGER_TILES:
-                    grid[r, c] = 8.0  # dmg incoming
-                else:
-                    grid[r, c] = 0.0  # empty
+        self.cells, self.map_emptiness = materialize_layout(
+            self.layout, self.episode_successes, self.map_emptiness, self.np_random
+        )
+
+        self.START_POSITIONS = self.layout["START_POSITIONS"]
+        self.WIN_TILE = self.layout["WIN_TILE"]
+
+        # Occupancy grid holds every object as cell flags (see occupancy.py),
+        # enemies and danger tiles also keep their order in lists. These lists, agent_pos and
+        # attack_highlight are replaced on change, never changed in place, so a TrajectoryRecorder
+        # can keep references to them instead of copies
+        self._wall_tiles = self.layout["WALL_TILES"]
+        self._rubble_tiles = self.layout["RUBBLE_TILES"]
+        self._enemy_positions = list(tiles_with(self.cells, ENEMY))
+        self._danger_tiles = []
+
+    # Read-only views of the occupancy grid, used by the renderer and scripts
+    @property
+    def WALL_TILES(self):
+        return self._wall_tiles
+
+    @property
+    def RUBBLE_TILES(self):
+        return self._rubble_tiles
+
+    @property
+    def DMG_TILES(self):
+        return tiles_with(self.cells, POISON)
+
+    @property
+    def REWARD_TILES(self):
+        return tiles_with(self.cells, REWARD)
+
+    @property
+    def ENEMY_POSITIONS(self):
+        return tuple(self._enemy_positions)
+
+    @property
+    def DANGER_TILES(self):
+        return tuple(self._danger_tiles)
+
+    def _in_bounds(self, pos):
+        return 0 <= pos[0] < self.grid_size[0] and 0 <= pos[1] < self.grid_size[1]
+
+    def _clear_danger(self):
+        if self._danger_tiles:
+            tiles = np.array(self._danger_tiles)
+            self.cells[tiles[:, 0], tiles[:, 1]] &= ~DANGER
+            self._refresh_obs_cells(tiles)
+            self._danger_tiles = []
+
+    def _add_flag(self, pos, flag):
+        self.cells[pos] |= flag
+        self._refresh_obs_cell(pos)
+
+    def _remove_flag(self, pos, flag):
+        self.cells[pos] &= ~flag
+        self._refresh_obs_cell(pos)
+
+    def _refresh_obs_cells(self, positions):
+        # array version of _refresh_obs_cell for (n, 2) positions
+        self._obs[positions[:, 0] * self.grid_size[1] + positions[:, 1]] = OBS_LUT[self.cells[positions[:, 0], positions[:, 1]]]
+        self._obs[self.agent_pos[0] * self.grid_size[1] + self.agent_pos[1]] = 1.0  # agent
+
+    def _refresh_obs_cell(self, pos):
+        index = pos[0] * self.grid_size[1] + pos[1]
+        if pos[0] == self.agent_pos[0] and pos[1] == self.agent_pos[1]:
+            self._obs[index] = 1.0  # agent
+        else:
+            self._obs[index] = OBS_LUT[self.cells[pos]]
+
+    def _rebuild_obs(self):
+        # a new buffer per episode, so an observation returned earlier is never overwritten by reset
+        grid = OBS_LUT[self.cells]
+        grid[tuple(self.agent_pos)] = 1.0  # agent
+        self._obs = grid.ravel()
 
-        return grid.flatten()
+    def _get_obs(self):
+        if self.copy_obs:
+            return self._obs.copy()
+        return self._obs
     
     #function params used for testing/training modifications
     def reset(self, seed=None, force_furthest=False, test_emptiness=None, use_low_level_actions=None, omit_step_penalty=None):
+        super().reset(seed=seed)
+        # fields are replaced below, keep their routing work in the totals
+        self._perf_expansions += self._field_expansions()
         self.step_count = 0
         self.wall_hit_count = 0
         self.wall_hit_streak = 0
         self.collected_reward_count = 0
         self.hit_reset_count = 0
         self.enemy_killed = 0
-        self.DANGER_TILES.clear()
         self.attack_highlight = []
-        self.recent_positions = []
+        self._clear_recent()
 
         if use_low_level_actions is not None:
             self.use_low_level_actions = use_low_level_actions
@@ -125,6 +252,17 @@ class GridWorldEnv(Env):
         self.omit_step_penalty = omit_step_penalty if omit_step_penalty is not None else self.default_omit_step_penalty
 
         self._load_layout_state()
+        self._goal_field = self._static_goal_field.copy()
+        self._goal_field.block(self.DMG_TILES)
+
+        # Rewards and enemies get one multi-source field each, updated as they change
+        passable = (self.cells & PATH_BLOCKERS) == 0
+        self._reward_field = DistanceField(passable)
+        self._reward_field.set_sources(self.REWARD_TILES)
+        self._enemy_field = DistanceField(passable)
+        self._enemy_field.set_sources(self._enemy_positions)
+        # enemy moves only mark the field stale, it is rebuilt when MOVE_TO_ENEMY needs it
+        self._enemy_field_stale = False
 
         self.initial_reward_tiles_count = len(self.REWARD_TILES)
         self.initial_reset_tile_count = len(self.DMG_TILES)
@@ -148,6 +286,7 @@ class GridWorldEnv(Env):
         self.trash_rotations.clear()
         self.trash_weights = [0.25, 0.25, 0.25, 0.1, 0.1, 0.05]
         self.trash_randomization()
+        self.renderer.reset()
 
         # Agent spawn logic 
         sorted_starts = sorted(
@@ -158,10 +297,10 @@ class GridWorldEnv(Env):
 
         if force_furthest:
             top_n = min(4, len(sorted_starts))
-            self.agent_pos = list(random.choice(sorted_starts[-top_n:]))  #pick 4 furthest
+            self.agent_pos = list(sorted_starts[-top_n:][self.np_random.integers(top_n)])  #pick 4 furthest
         elif self.curriculum_level >= len(self.START_POSITIONS) - 1:
             top_n = min(4, len(sorted_starts))
-            self.agent_pos = list(random.choice(sorted_starts[-top_n:])) 
+            self.agent_pos = list(sorted_starts[-top_n:][self.np_random.integers(top_n)])
         else:
             max_index = min(self.curriculum_level, len(sorted_starts) - 1)
             self.agent_pos = list(sorted_starts[max_index])  # curriculum: closer → further
@@ -171,86 +310,74 @@ class GridWorldEnv(Env):
         if test_emptiness is not None:
             self.map_emptiness = test_emptiness
 
-        self.ENEMY_POSITIONS = list(self.ENEMY_POSITIONS)
         self.ENEMY_TARGETS = {}
 
-        return self._get_obs(), {}
+        self._rebuild_obs()
+        return self._get_obs(), {"action_mask": self.action_masks()}
+
+    def _draw_textures(self, count, amount, weights):
+        # texture id and (flip x, flip y) for count tiles in one draw each
+        weights = np.asarray(weights, dtype=np.float64)
+        texture_ids = self.np_random.choice(amount, size=count, p=weights / weights.sum())
+        flips = self.np_random.integers(0, 2, size=(count, 2)).astype(bool)
+        return texture_ids.tolist(), list(map(tuple, flips.tolist()))
 
     def wall_randomization(self):
-        for tile in self.WALL_TILES:
-            texture_id = random.choices(range(WALL_TYPE_AMOUNT), weights=self.wall_weights, k=1)[0]
-            self.wall_textures_id[tile] = texture_id
-            self.wall_rotations[tile] = (
-                random.choice([True, False]),
-                random.choice([True, False])
-            )
+        tiles = self.WALL_TILES
+        texture_ids, rotations = self._draw_textures(len(tiles), WALL_TYPE_AMOUNT, self.wall_weights)
+        self.wall_textures_id.update(zip(tiles, texture_ids))
+        self.wall_rotations.update(zip(tiles, rotations))
 
     def rubble_randomization(self):
-        for tile in self.RUBBLE_TILES:
-            texture_id = random.choices(range(RUBBLE_TYPE_AMOUNT), weights=self.rubble_weights, k=1)[0]
-            self.rubble_textures_id[tile] = texture_id
-            self.rubble_rotations[tile] = (
-                random.choice([True, False]),
-                random.choice([True, False])
-            )
+        tiles = self.RUBBLE_TILES
+        texture_ids, rotations = self._draw_textures(len(tiles), RUBBLE_TYPE_AMOUNT, self.rubble_weights)
+        self.rubble_textures_id.update(zip(tiles, texture_ids))
+        self.rubble_rotations.update(zip(tiles, rotations))
 
     def trash_randomization(self):
-        for tile in self.REWARD_TILES:
-            texture_id = random.choices(range(TRASH_TYPE_AMOUNT), weights=self.trash_weights, k=1)[0]
-            self.trash_textures_id[tile] = texture_id
-            self.trash_rotations[tile] = (
-                random.choice([True, False]),
-                random.choice([True, False])
-            )
+        tiles = self.REWARD_TILES
+        texture_ids, rotations = self._draw_textures(len(tiles), TRASH_TYPE_AMOUNT, self.trash_weights)
+        self.trash_textures_id.update(zip(tiles, texture_ids))
+        self.trash_rotations.update(zip(tiles, rotations))
 
-            base_size = 48
-            self.trash_offsets[tile] = (
-                random.randint(-10, 10),
-                random.randint(-10, 10)
-            )
-            scale_factor = random.uniform(0.6, 1.2)
-            new_size = int(base_size * scale_factor)
-            self.trash_sizes[tile] = (new_size, new_size)
+        base_size = 48
+        offsets = self.np_random.integers(-10, 11, size=(len(tiles), 2))
+        scale_factors = self.np_random.uniform(0.6, 1.2, size=len(tiles))
+        self.trash_offsets.update(zip(tiles, map(tuple, offsets.tolist())))
+        self.trash_sizes.update((tile, (int(base_size * scale), int(base_size * scale))) for tile, scale in zip(tiles, scale_factors.tolist()))
 
     def enemy_step(self):
         #wont move into most objects and other enemies
-        new_enemy_positions = []
-
         if self.step_count % 2 == 0:
-            self.DANGER_TILES.clear()
-            reserved_targets = set()
+            # danger tiles double as the reserved targets
+            self._clear_danger()
             self.ENEMY_TARGETS.clear()
 
-            for pos in self.ENEMY_POSITIONS:
-                r, c = pos
-                neighbors = [
-                    (r - 1, c), (r + 1, c),
-                    (r, c - 1), (r, c + 1)
-                ]
-                valid_moves = [
-                    n for n in neighbors
-                    if 0 <= n[0] < self.grid_size[0] and 0 <= n[1] < self.grid_size[1]
-                    and n not in self.WALL_TILES
-                    and n not in self.RUBBLE_TILES
-                    and n not in reserved_targets
-                    and n not in self.ENEMY_POSITIONS
-                    and n not in self.DMG_TILES
-                ]
-                if valid_moves:
-                    next_pos = random.choice(valid_moves)
-                    self.ENEMY_TARGETS[pos] = next_pos
-                    self.DANGER_TILES.append(next_pos)
-                    reserved_targets.add(next_pos)
-                else:
-                    self.ENEMY_TARGETS[pos] = pos  # no move
+            # one uniform per enemy picks among its valid moves, all enemies are planned at once
+            draws = self.np_random.random(len(self._enemy_positions))
+            if not self._enemy_positions:
+                return
+            positions = np.array(self._enemy_positions)
+            targets = telegraph_moves(self.cells[None], np.zeros(len(positions), dtype=np.int64), positions, draws)
+
+            moving = (targets != positions).any(axis=1)
+            self._refresh_obs_cells(targets[moving])
+            self._danger_tiles = list(map(tuple, targets[moving].tolist()))
+            self.ENEMY_TARGETS = dict(zip(self._enemy_positions, map(tuple, targets.tolist())))
 
         else:
-            for old_pos in self.ENEMY_POSITIONS:
-                next_pos = self.ENEMY_TARGETS.get(old_pos, old_pos)
-                new_enemy_positions.append(next_pos)
-            self.ENEMY_POSITIONS = new_enemy_positions
+            new_enemy_positions = [self.ENEMY_TARGETS.get(pos, pos) for pos in self._enemy_positions]
+            moved = [(old, new) for old, new in zip(self._enemy_positions, new_enemy_positions) if old != new]
+            if moved:
+                old, new = np.array(moved).transpose(1, 0, 2)
+                self.cells[old[:, 0], old[:, 1]] &= ~ENEMY
+                self.cells[new[:, 0], new[:, 1]] |= ENEMY
+                self._refresh_obs_cells(old)
+                self._refresh_obs_cells(new)
+                self._enemy_field_stale = True
+            self._enemy_positions = new_enemy_positions
             self.ENEMY_TARGETS.clear()
-            self.DANGER_TILES.clear()
+            self._clear_danger()
 
     def _fallback_move(self, reason):
         #Try moving to safe tile, then try any valid direction that is not blocked.
@@ -270,32 +397,75 @@ class GridWorldEnv(Env):
 
         for d in possible_dirs:
             target = candidates[d]
-            if (0 <= target[0] < self.grid_size[0] and
-                0 <= target[1] < self.grid_size[1] and
-                target not in self.WALL_TILES and
-                target not in self.RUBBLE_TILES):
+            if self._in_bounds(target) and not self.cells[target] & AGENT_BLOCKERS:
                 return self._step_low_level(d)
 
         return self._get_obs(), -1, True, False, {"result": reason + "_stuck"}
 
-    def step(self, action): 
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self._take_action(action)
+        info["action_mask"] = self.action_masks()
+        return obs, reward, terminated, truncated, info
+
+    def action_masks(self):
+        # True for the actions that would do something now, for maskable PPO. High level: a path to
+        # the goal/reward/enemy or a safe tile exists, low level: the move isn't into a wall or rubble.
+        # Attack needs an enemy in reach once the coming enemy step is done
+        mask = np.zeros(5, dtype=bool)
+        if self.use_low_level_actions:
+            row, col = self.agent_pos
+            for action, (dr, dc) in enumerate(DIRECTIONS.tolist()):
+                pos = (row + dr, col + dc)
+                mask[action] = self._in_bounds(pos) and not self.cells[pos] & AGENT_BLOCKERS
+            mask[4] = self._enemy_in_reach()
+        else:
+            mask[0] = self._goal_field.direction(self.agent_pos) is not None
+            mask[1] = self._reward_field.direction(self.agent_pos) is not None
+            mask[2] = bool(self._safe_moves())
+            mask[3] = self._enemy_in_reach()
+            # a stale enemy field is only rebuilt when the action is taken, until then any enemy counts
+            mask[4] = bool(self._enemy_positions) and (
+                self._enemy_field_stale or self._enemy_field.direction(self.agent_pos) is not None
+            )
+        if not mask.any():
+            mask[:] = True
+        return mask
+
+    def _enemy_in_reach(self):
+        # the two tiles in front of the agent, as the attack in _step_low_level sees them
+        dr, dc = DIRECTIONS[FACINGS.index(self.agent_facing)].tolist()
+        moving = self.step_count % 2 == 1  # enemies jump to their targets before the attack
+        for reach in (1, 2):
+            pos = (self.agent_pos[0] + reach * dr, self.agent_pos[1] + reach * dc)
+            if not self._in_bounds(pos):
+                continue
+            if not self.cells[pos] & (ENEMY | DANGER):
+                continue
+            if not moving:
+                if self.cells[pos] & ENEMY:
+                    return True
+            elif any(self.ENEMY_TARGETS.get(enemy, enemy) == pos for enemy in self._enemy_positions):
+                return True
+        return False
+
+    def _take_action(self, action):
 
         if self.use_low_level_actions:
             return self._step_low_level(action)
 
         if action == 0:  # MOVE_TO_GOAL
-            direction = self._get_direction_to_target(self.WIN_TILE)
+            direction = self._path_direction(self._goal_field)
             if direction is not None:
                 return self._step_low_level(direction)
             else:
                 return self._fallback_move("no_path_to_goal")
 
         elif action == 1:  # MOVE_TO_REWARD
-            direction = self._get_direction_to_target(self.REWARD_TILES)
+            direction = self._path_direction(self._reward_field)
             if direction is not None:
                 return self._step_low_level(direction)
             else:
-                direction = self._get_direction_to_target(self.WIN_TILE)
+                direction = self._path_direction(self._goal_field)
                 if direction is not None:
                     return self._step_low_level(direction)
                 else:
@@ -312,22 +482,62 @@ class GridWorldEnv(Env):
             low_action = 4
 
         elif action == 4:  # MOVE_TO_ENEMY
-            direction = self._get_direction_to_target(self.ENEMY_POSITIONS)
+            direction = self._path_direction(self._current_enemy_field())
             if direction is not None:
                 return self._step_low_level(direction)
             else:
-                direction = self._get_direction_to_target(self.WIN_TILE)
+                direction = self._path_direction(self._goal_field)
                 if direction is not None:
                     return self._step_low_level(direction)
                 else:
                     return self._fallback_move("no_enemies")
         else:
-            low_action = random.choice([0, 1, 2, 3])
+            low_action = int(self.np_random.integers(4))
 
         return self._step_low_level(low_action)
     
-    def _get_safe_direction(self):
-        #Choose a safe direction from current position
+    def _current_enemy_field(self):
+        if self._enemy_field_stale:
+            self._enemy_field.set_sources(self._enemy_positions)
+            self._enemy_field_stale = False
+        return self._enemy_field
+
+    @property
+    def recent_positions(self):
+        # cells of the loop window, oldest first
+        cols = self.grid_size[1]
+        start = self._recent_head - self._recent_len
+        cells = [self._recent_cells[(start + i) % self.loop_window] for i in range(self._recent_len)]
+        return [divmod(cell, cols) for cell in cells]
+
+    def _record_position(self, pos):
+        cell = pos[0] * self.grid_size[1] + pos[1]
+        counts = self._visit_counts
+        if self._recent_len == self.loop_window:
+            oldest = self._recent_cells[self._recent_head]
+            counts[oldest] -= 1
+            if not counts[oldest]:
+                self._recent_unique -= 1
+        else:
+            self._recent_len += 1
+        self._recent_cells[self._recent_head] = cell
+        self._recent_head = (self._recent_head + 1) % self.loop_window
+        if not counts[cell]:
+            self._recent_unique += 1
+        counts[cell] += 1
+
+    def _clear_recent(self):
+        # only the cells still in the window have counts left
+        for cell in self._recent_cells[:self._recent_len]:
+            self._visit_counts[cell] = 0
+        self._recent_head = 0
+        self._recent_len = 0
+        self._recent_unique = 0
+
+    def _path_direction(self, field):
+        return field.direction(self.agent_pos)
+
+    def _safe_moves(self):
         row, col = self.agent_pos
         directions = [
             (-1, 0),  # up
@@ -340,70 +550,19 @@ class GridWorldEnv(Env):
         for idx, (dr, dc) in enumerate(directions):
             nr, nc = row + dr, col + dc
             pos = (nr, nc)
-            if (
-                0 <= nr < self.grid_size[0]
-                and 0 <= nc < self.grid_size[1]
-                and pos not in self.WALL_TILES
-                and pos not in self.RUBBLE_TILES
-                and pos not in self.DMG_TILES
-                and pos not in self.DANGER_TILES
-                and pos not in self.ENEMY_POSITIONS
-            ):
+            if self._in_bounds(pos) and not self.cells[pos] & (PATH_BLOCKERS | DANGER | ENEMY):
                 safe_moves.append((idx, pos))
 
+        return safe_moves
+
+    def _get_safe_direction(self):
+        #Choose a safe direction from current position
+        safe_moves = self._safe_moves()
         if not safe_moves:
             return None
 
-        return random.choice(safe_moves)[0]
+        return safe_moves[self.np_random.integers(len(safe_moves))][0]
     
-    def _get_direction_to_target(self, targets):
-        if not isinstance(targets, list):
-            targets = [targets]
-
-        rows, cols = self.grid_size
-        visited = set()
-        queue = deque()
-        came_from = {}
-
-        start = tuple(self.agent_pos)
-        queue.append(start)
-        visited.add(start)
-
-        blocked = set(self.WALL_TILES + self.RUBBLE_TILES + self.DMG_TILES)
-        found_target = None
-
-        while queue:
-            current = queue.popleft()
-            if current in targets:
-                found_target = current
-                break
-            for dr, dc in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                nr, nc = current[0] + dr, current[1] + dc
-                neighbor = (nr, nc)
-                if (0 <= nr < rows and 0 <= nc < cols and
-                    neighbor not in visited and
-                    neighbor not in blocked):
-                    queue.append(neighbor)
-                    visited.add(neighbor)
-                    came_from[neighbor] = current
-
-        if found_target is None:
-            return None
-
-        step = found_target
-        while came_from.get(step) != start:
-            step = came_from[step]
-
-        dir_map = {
-            (-1, 0): 0,  # up
-            (1, 0): 1,   # down
-            (0, -1): 2,  # left
-            (0, 1): 3    # right
-        }
-        dr = step[0] - start[0]
-        dc = step[1] - start[1]
-        return dir_map.get((dr, dc))
-
     def _step_low_level(self, action):
         self.attack_highlight = []
         self.enemy_step()
@@ -432,8 +591,11 @@ class GridWorldEnv(Env):
                 (self.agent_pos[0] + 2 * dr, self.agent_pos[1] + 2 * dc)
             ]
             for target in targets:
-                if target in self.ENEMY_POSITIONS:
-                    self.ENEMY_POSITIONS.remove(target)
+                if self._in_bounds(target) and self.cells[target] & ENEMY:
+                    self._enemy_positions = [pos for pos in self._enemy_positions if pos != target]
+                    self._remove_flag(target, ENEMY)
+                    if not self._enemy_field_stale:
+                        self._enemy_field.remove_sources([target])
                     hit_enemy = True
                     self.enemy_killed += 1
                     reward += 0.1
@@ -456,11 +618,14 @@ class GridWorldEnv(Env):
 
             target_pos = (row, col)
 
-            if target_pos in self.WALL_TILES + self.RUBBLE_TILES:
+            if self.cells[target_pos] & AGENT_BLOCKERS:
                 valid_move = False
                 row, col = old_row, old_col
 
             self.agent_pos = [row, col]
+            if (row, col) != (old_row, old_col):
+                self._refresh_obs_cell((old_row, old_col))
+                self._refresh_obs_cell((row, col))
 
             if valid_move:
                 if action == 0:
@@ -484,35 +649,35 @@ class GridWorldEnv(Env):
                 self.wall_hit_streak = 0
 
             # Loop/oscillation detection
-            self.recent_positions.append(tuple(self.agent_pos))
-            if len(self.recent_positions) > 30:
-                self.recent_positions.pop(0)
-
-            if len(self.recent_positions) >= 30:
-                recent = self.recent_positions[-30:]
-                unique_positions = set(recent)
-                if len(unique_positions) <= 4:
+            self._record_position(self.agent_pos)
+            if self._recent_len >= self.loop_window:
+                if self._recent_unique <= self.loop_max_unique:
                     reward = -1
                     truncated = True
                     info["result"] = "oscillation/loop_stuck"
                     return self._get_obs(), reward, terminated, truncated, info
 
+        pos = tuple(self.agent_pos)
+
         # Collision with reward
-        if tuple(self.agent_pos) in self.REWARD_TILES:
+        if self.cells[pos] & REWARD:
             reward += 0.1
-            self.REWARD_TILES.remove(tuple(self.agent_pos))
+            self._remove_flag(pos, REWARD)
+            self._reward_field.remove_sources([pos])
             self.collected_reward_count += 1
 
         # Collision with enemy
-        if tuple(self.agent_pos) in self.ENEMY_POSITIONS:
+        if self.cells[pos] & ENEMY:
             reward -= 1
             terminated = True
             info["result"] = "u died"
             return self._get_obs(), reward, terminated, truncated, info
 
         # Collision with reset tile (poison)
-        if tuple(self.agent_pos) in self.DMG_TILES:
-            self.DMG_TILES.remove(tuple(self.agent_pos))
+        if self.cells[pos] & POISON:
+            self._remove_flag(pos, POISON)
+            for field in (self._goal_field, self._reward_field, self._enemy_field):
+                field.unblock([pos])
             self.hit_reset_count += 1
             if self.hit_reset_count >= 1:
                 reward -= 1
@@ -521,18 +686,14 @@ class GridWorldEnv(Env):
                 return self._get_obs(), reward, terminated, truncated, info
 
         # Win condition
-        if tuple(self.agent_pos) == self.WIN_TILE:
+        if pos == self.WIN_TILE:
             reward = 1 + self.collected_reward_count + self.enemy_killed
             if not self.omit_step_penalty:
                 reward -= 0.01 * self.step_count
 
             terminated = True
             info["result"] = "success"
-            self.episode_successes += 1
-            if self.episode_successes >= 5:
-                self.curriculum_level += 1
-                self.episode_successes = 0
-                print(self.curriculum_level)
+            self._register_success()
             return self._get_obs(), reward, terminated, truncated, info
 
         # Timeout
@@ -544,9 +705,181 @@ class GridWorldEnv(Env):
 
         return self._get_obs(), reward, terminated, truncated, info
 
-    
-    def render(self, mode="human"):
-        self.renderer.render()
+    @property
+    def curriculum_level(self):
+        return self.curriculum.level
+
+    @property
+    def episode_successes(self):
+        return self.curriculum.episode_successes
+
+    def _register_success(self):
+        # curriculum: every 5 successes move the spawn further from the goal
+        level = self.curriculum_level
+        self.curriculum.record_success()
+        if self.curriculum_level > level:
+            print(self.curriculum_level)
+
+    def _install_profiling(self, profile_info):
+        times, calls = self._perf_time_ns, self._perf_calls
+        for phase, name in PERF_PHASES.items():
+            def timed(*args, _method=getattr(self, name), _phase=phase, **kwargs):
+                start = time.perf_counter_ns()
+                try:
+                    return _method(*args, **kwargs)
+                finally:
+                    times[_phase] += time.perf_counter_ns() - start
+                    calls[_phase] += 1
+            setattr(self, name, timed)
+
+        if profile_info:
+            step = self.step
+
+            def step_with_perf(action):
+                obs, reward, terminated, truncated, info = step(action)
+                info["perf"] = self.get_perf_stats()
+                return obs, reward, terminated, truncated, info
+            self.step = step_with_perf
+
+    def _field_expansions(self):
+        fields = (getattr(self, name, None) for name in ("_goal_field", "_reward_field", "_enemy_field"))
+        return sum(field.expansions for field in fields if field is not None and field is not self._static_goal_field)
+
+    def get_perf_stats(self):
+        # cumulative time (ns) and calls per phase plus distance field expansions, since creation or reset_perf_stats
+        stats = {
+            phase: {"calls": self._perf_calls[phase], "time_ns": self._perf_time_ns[phase]}
+            for phase in PERF_PHASES
+        }
+        stats["field_expansions"] = self._perf_expansions + self._field_expansions()
+        return stats
+
+    def reset_perf_stats(self):
+        for phase in PERF_PHASES:
+            self._perf_time_ns[phase] = 0
+            self._perf_calls[phase] = 0
+        self._perf_expansions = -self._field_expansions()
+
+    def get_state(self, out=None):
+        # Packs the dynamic game state into a state_dtype record (reuses out when given)
+        state = np.zeros((), dtype=self.state_dtype) if out is None else out
+        state["agent_pos"] = self.agent_pos
+        state["agent_facing"] = FACINGS.index(self.agent_facing)
+        state["omit_step_penalty"] = self.omit_step_penalty
+        state["use_low_level_actions"] = self.use_low_level_actions
+        state["counters"] = (
+            self.step_count, self.wall_hit_count, self.wall_hit_streak,
+            self.collected_reward_count, self.hit_reset_count, self.enemy_killed
+        )
+        state["cells"] = self.cells
+
+        enemy_count = len(self._enemy_positions)
+        state["enemy_count"] = enemy_count
+        state["has_enemy_targets"] = bool(self.ENEMY_TARGETS)
+        if enemy_count:
+            state["enemy_pos"][:enemy_count] = self._enemy_positions
+            state["enemy_targets"][:enemy_count] = [self.ENEMY_TARGETS.get(pos, pos) for pos in self._enemy_positions]
+        state["enemy_field_stale"] = self._enemy_field_stale
+        state["danger_count"] = len(self._danger_tiles)
+        if self._danger_tiles:
+            state["danger_pos"][:len(self._danger_tiles)] = self._danger_tiles
+
+        state["recent_cells"] = self._recent_cells
+        state["recent_window"] = (self._recent_head, self._recent_len, self._recent_unique)
+        state["attack_count"] = len(self.attack_highlight)
+        if self.attack_highlight:
+            state["attack_highlight"] = self.attack_highlight
+
+        # PCG64 state and increment (128 bit each) split into 64 bit words
+        rng_state = self.np_random.bit_generator.state
+        words = []
+        for value in (rng_state["state"]["state"], rng_state["state"]["inc"]):
+            words += [value >> 64, value & 0xFFFFFFFFFFFFFFFF]
+        state["rng_state"] = words
+        state["rng_has_uint32"] = rng_state["has_uint32"]
+        state["rng_uinteger"] = rng_state["uinteger"]
+        return state
+
+    def set_state(self, state):
+        # Restores a get_state record. Only the cells that differ from the live grid are patched in the
+        # distance fields and the observation, restoring a state with the same cells skips the fields
+        old_index = self.agent_pos[0] * self.grid_size[1] + self.agent_pos[1]
+        self.agent_pos = state["agent_pos"].tolist()
+        self.agent_facing = FACINGS[state["agent_facing"]]
+        self.omit_step_penalty = bool(state["omit_step_penalty"])
+        self.use_low_level_actions = bool(state["use_low_level_actions"])
+        (
+            self.step_count, self.wall_hit_count, self.wall_hit_streak,
+            self.collected_reward_count, self.hit_reset_count, self.enemy_killed
+        ) = state["counters"].tolist()
+
+        enemy_count = int(state["enemy_count"])
+        self._enemy_positions = list(map(tuple, state["enemy_pos"][:enemy_count].tolist()))
+        self.ENEMY_TARGETS = {}
+        if state["has_enemy_targets"]:
+            targets = map(tuple, state["enemy_targets"][:enemy_count].tolist())
+            self.ENEMY_TARGETS = dict(zip(self._enemy_positions, targets))
+        self._danger_tiles = list(map(tuple, state["danger_pos"][:int(state["danger_count"])].tolist()))
+
+        # the visit counts are rebuilt only for the cells of the old and the new window
+        recent_cells = state["recent_cells"].tolist()
+        head, length, unique = state["recent_window"].tolist()
+        if recent_cells != self._recent_cells or length != self._recent_len or head != self._recent_head:
+            counts = self._visit_counts
+            for cell in self._recent_cells[:self._recent_len]:
+                counts[cell] = 0
+            for cell in recent_cells[:length]:
+                counts[cell] += 1
+            self._recent_cells = recent_cells
+        self._recent_head, self._recent_len, self._recent_unique = head, length, unique
+        self.attack_highlight = list(map(tuple, state["attack_highlight"][:state["attack_count"]].tolist()))
+
+        words = state["rng_state"].tolist()
+        self.np_random.bit_generator.state = {
+            "bit_generator": "PCG64",
+            "state": {"state": (words[0] << 64) | words[1], "inc": (words[2] << 64) | words[3]},
+            "has_uint32": int(state["rng_has_uint32"]),
+            "uinteger": int(state["rng_uinteger"]),
+        }
+
+        enemies_moved = False
+        cells = state["cells"]
+        if cells.tobytes() != self.cells.tobytes():
+            flat, new_flat = self.cells.reshape(-1), cells.reshape(-1)
+            changed = np.flatnonzero(flat != new_flat)
+            old, new = flat[changed], new_flat[changed]
+            flat[changed] = new
+            self._obs[changed] = OBS_LUT[new]
+            # most restores in a search only move enemies and danger tiles, which no field is blocked by
+            flipped = int(np.bitwise_or.reduce(old ^ new))
+            if flipped & (PATH_BLOCKERS | REWARD):
+                positions = np.column_stack(np.divmod(changed, self.grid_size[1]))
+                was_open, is_open = (old & PATH_BLOCKERS) == 0, (new & PATH_BLOCKERS) == 0
+                blocked, opened = positions[was_open & ~is_open], positions[is_open & ~was_open]
+                for field in (self._goal_field, self._reward_field, self._enemy_field):
+                    if len(blocked):
+                        field.block(blocked)
+                    if len(opened):
+                        field.unblock(opened)
+                had_reward, has_reward = ((old & REWARD) != 0) & was_open, ((new & REWARD) != 0) & is_open
+                if (had_reward != has_reward).any():
+                    self._reward_field.remove_sources(positions[had_reward & ~has_reward])
+                    self._reward_field.add_sources(positions[has_reward & ~had_reward])
+            enemies_moved = bool(flipped & ENEMY)
+
+        # the enemy field is as fresh as it was when the state was taken, action_masks depends on it
+        if state["enemy_field_stale"]:
+            self._enemy_field_stale = True
+        elif enemies_moved or self._enemy_field_stale:
+            self._enemy_field.set_sources(self._enemy_positions)
+            self._enemy_field_stale = False
+
+        cols = self.grid_size[1]
+        self._obs[old_index] = OBS_LUT[self.cells.flat[old_index]]
+        self._obs[self.agent_pos[0] * cols + self.agent_pos[1]] = 1.0
+
+    def render(self):
+        return self.renderer.render()
 
     def close(self):
         self.renderer.close()
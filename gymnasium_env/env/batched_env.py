@@ -0,0 +1,325 @@
+import numpy as np
+from gymnasium import spaces
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
+
+from .base_env import GridWorldEnv
+from .occupancy import POISON, REWARD, ENEMY, DANGER, AGENT_BLOCKERS, OBS_LUT
+from .enemies import DIRECTIONS, telegraph_moves
+
+FACINGS = ["up", "down", "left", "right"]
+
+# info["result"] values, 0 means no result for that env
+RESULTS = [None, "enemy_killed", "stuck_same_tile", "oscillation/loop_stuck", "u died", "success", "timeout"]
+(NO_RESULT, ENEMY_KILLED, STUCK, OSCILLATION, DIED, SUCCESS, TIMEOUT) = range(len(RESULTS))
+
+
+class BatchedGridWorldEnv(VectorEnv):
+    """Steps num_envs copies of GridWorldEnv (low level actions) as numpy array operations.
+
+    Every sub-env keeps a GridWorldEnv that is only used for resets (layout parsing, spawn and
+    curriculum) and as the owner of its random stream, so with the same seeds the outcomes match
+    the scalar env step for step.
+    """
+
+    metadata = {"autoreset_mode": AutoresetMode.SAME_STEP}
+
+    def __init__(self, layout_path, num_envs, loop_window=30, loop_max_unique=4, curriculum=None):
+        # with a curriculum all sub-envs advance it together, otherwise each has its own
+        self.envs = [
+            GridWorldEnv(layout_path, loop_window=loop_window, loop_max_unique=loop_max_unique, curriculum=curriculum)
+            for _ in range(num_envs)
+        ]
+
+        self.num_envs = num_envs
+        self.grid_size = self.envs[0].grid_size
+        rows, cols = self.grid_size
+
+        self.single_action_space = spaces.Discrete(5)
+        self.single_observation_space = self.envs[0].observation_space
+        self.action_space = batch_space(self.single_action_space, num_envs)
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+
+        first = self.envs[0]
+        self.win_tile = np.array(first.WIN_TILE if first.WIN_TILE is not None else (-1, -1))
+
+        # every 'M' and 'A' tile can hold an enemy
+        max_enemies = first.layout["max_enemies"]
+
+        n = num_envs
+        self.cells = np.zeros((n, rows, cols), dtype=np.uint8)
+        self.agent_pos = np.zeros((n, 2), dtype=np.int64)
+        self.agent_facing = np.full(n, FACINGS.index("down"), dtype=np.int64)
+        self.enemy_pos = np.zeros((n, max_enemies, 2), dtype=np.int64)
+        self.enemy_targets = np.zeros((n, max_enemies, 2), dtype=np.int64)
+        self.enemy_alive = np.zeros((n, max_enemies), dtype=bool)
+
+        self.step_count = np.zeros(n, dtype=np.int64)
+        self.wall_hit_count = np.zeros(n, dtype=np.int64)
+        self.wall_hit_streak = np.zeros(n, dtype=np.int64)
+        self.collected_reward_count = np.zeros(n, dtype=np.int64)
+        self.hit_reset_count = np.zeros(n, dtype=np.int64)
+        self.enemy_killed = np.zeros(n, dtype=np.int64)
+        self.omit_step_penalty = np.zeros(n, dtype=bool)
+
+        # Last loop_window agent cells as a ring buffer with visit counts per cell, used for loop detection
+        self.loop_window = loop_window
+        self.loop_max_unique = loop_max_unique
+        self.recent_positions = np.zeros((n, loop_window), dtype=np.int64)
+        self.recent_head = np.zeros(n, dtype=np.int64)
+        self.recent_len = np.zeros(n, dtype=np.int64)
+        self.recent_unique = np.zeros(n, dtype=np.int64)
+        self.visit_counts = np.zeros((n, rows * cols), dtype=np.int32)
+
+        self._env_index = np.arange(n)
+        self._reset_kwargs = {}
+
+    def reset(self, seed=None, options=None):
+        seeds = [None] * self.num_envs
+        if seed is not None:
+            seeds = [seed + i for i in range(self.num_envs)] if isinstance(seed, int) else list(seed)
+
+        self._reset_kwargs = dict(options or {})
+        for i in range(self.num_envs):
+            self._reset_env(i, seeds[i])
+        return self._get_obs(), self._mask_info({})
+
+    def _reset_env(self, i, seed=None):
+        env = self.envs[i]
+        env.reset(seed=seed, **self._reset_kwargs)
+
+        self.cells[i] = env.cells
+        count = len(env.ENEMY_POSITIONS)
+        if count:
+            self.enemy_pos[i, :count] = env.ENEMY_POSITIONS
+        self.enemy_targets[i] = self.enemy_pos[i]
+        self.enemy_alive[i] = False
+        self.enemy_alive[i, :count] = True
+
+        # facing is kept between episodes, same as the scalar env
+        self.agent_pos[i] = env.agent_pos
+        self.step_count[i] = 0
+        self.wall_hit_count[i] = 0
+        self.wall_hit_streak[i] = 0
+        self.collected_reward_count[i] = 0
+        self.hit_reset_count[i] = 0
+        self.enemy_killed[i] = 0
+        self.omit_step_penalty[i] = env.omit_step_penalty
+        self.recent_head[i] = 0
+        self.recent_len[i] = 0
+        self.recent_unique[i] = 0
+        self.visit_counts[i] = 0
+
+    def _get_obs(self):
+        obs = OBS_LUT[self.cells]
+        obs[self._env_index, self.agent_pos[:, 0], self.agent_pos[:, 1]] = 1.0
+        return obs.reshape(self.num_envs, -1)
+
+    def action_masks(self):
+        # (num_envs, 5) low level masks, same rules as GridWorldEnv.action_masks
+        rows, cols = self.grid_size
+        neighbors = self.agent_pos[:, None, :] + DIRECTIONS
+        in_bounds = ((neighbors >= 0) & (neighbors < (rows, cols))).all(axis=2)
+        flags = self.cells[self._env_index[:, None], neighbors[..., 0] % rows, neighbors[..., 1] % cols]
+        masks = np.zeros((self.num_envs, 5), dtype=bool)
+        masks[:, :4] = in_bounds & (flags & AGENT_BLOCKERS == 0)
+
+        # enemies jump to their targets before the attack on odd steps
+        moving = self.step_count % 2 == 1
+        enemies = np.where(moving[:, None, None], self.enemy_targets, self.enemy_pos)
+        facing = DIRECTIONS[self.agent_facing]
+        for reach in (1, 2):
+            target = self.agent_pos + reach * facing
+            masks[:, 4] |= (self.enemy_alive & (enemies == target[:, None, :]).all(axis=2)).any(axis=1)
+
+        masks[~masks.any(axis=1)] = True
+        return masks
+
+    def _mask_info(self, infos):
+        infos["action_mask"] = self.action_masks()
+        infos["_action_mask"] = np.ones(self.num_envs, dtype=bool)
+        return infos
+
+    def _enemy_step(self):
+        telegraph = self.step_count % 2 == 0
+
+        # Telegraph phase: pick a free neighbour for each enemy in order, marking it as danger
+        if telegraph.any():
+            self.cells[telegraph] &= ~DANGER
+            # same draws as the scalar env: one uniform per living enemy, in order
+            draws = np.zeros(self.enemy_alive.shape)
+            for i in np.flatnonzero(telegraph):
+                alive = self.enemy_alive[i]
+                draws[i, alive] = self.envs[i].np_random.random(alive.sum())
+
+            moving = telegraph[:, None] & self.enemy_alive
+            env_ids, _ = np.nonzero(moving)
+            self.enemy_targets[moving] = telegraph_moves(self.cells, env_ids, self.enemy_pos[moving], draws[moving])
+
+        # Move phase: every enemy jumps to its telegraphed tile
+        moving = ~telegraph[:, None] & self.enemy_alive
+        if moving.any():
+            env_ids = np.broadcast_to(self._env_index[:, None], moving.shape)[moving]
+            old = self.enemy_pos[moving]
+            new = self.enemy_targets[moving]
+            self.cells[env_ids, old[:, 0], old[:, 1]] &= ~ENEMY
+            self.cells[env_ids, new[:, 0], new[:, 1]] |= ENEMY
+            self.enemy_pos[moving] = new
+        self.cells[~telegraph] &= ~DANGER
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        rows, cols = self.grid_size
+        n = self.num_envs
+        env_index = self._env_index
+
+        self._enemy_step()
+        self.step_count += 1
+
+        reward = np.zeros(n, dtype=np.float64)
+        terminated = np.zeros(n, dtype=bool)
+        truncated = np.zeros(n, dtype=bool)
+        result = np.zeros(n, dtype=np.int64)
+        active = np.ones(n, dtype=bool)
+
+        # Attack: kill enemies on the two tiles in front of the agent
+        attack = actions == 4
+        if attack.any():
+            facing = DIRECTIONS[self.agent_facing]
+            hit_any = np.zeros(n, dtype=bool)
+            for reach in (1, 2):
+                target = self.agent_pos + reach * facing
+                hit = attack[:, None] & self.enemy_alive & (self.enemy_pos == target[:, None, :]).all(axis=2)
+                hit_env = hit.any(axis=1)
+                if not hit_env.any():
+                    continue
+                self.enemy_alive &= ~hit
+                self.cells[hit_env, target[hit_env, 0], target[hit_env, 1]] &= ~ENEMY
+                self.enemy_killed += hit_env
+                reward[hit_env] += 0.1
+                hit_any |= hit_env
+            result[hit_any] = ENEMY_KILLED
+
+        # Movement
+        move = ~attack
+        row, col = self.agent_pos[:, 0].copy(), self.agent_pos[:, 1].copy()
+        up = move & (actions == 0) & (row > 0)
+        down = move & (actions == 1) & (row < rows - 1)
+        left = move & (actions == 2) & (col > 0)
+        right = move & (actions == 3) & (col < cols - 1)
+        row -= up
+        row += down
+        col -= left
+        col += right
+        valid = up | down | left | right
+        blocked = self.cells[env_index, row, col] & AGENT_BLOCKERS != 0
+        valid &= ~blocked
+        self.agent_pos[valid, 0] = row[valid]
+        self.agent_pos[valid, 1] = col[valid]
+        self.agent_facing[valid] = actions[valid]
+        self.wall_hit_streak[valid] = 0
+
+        invalid = move & ~valid
+        self.wall_hit_count += invalid
+        self.wall_hit_streak += invalid
+        stuck = invalid & (self.wall_hit_streak >= 10)
+        truncated |= stuck
+        reward[stuck] -= 1
+        result[stuck] = STUCK
+        active &= ~stuck
+
+        # Loop/oscillation detection
+        tracked = np.flatnonzero(move & active)
+        if len(tracked):
+            head = self.recent_head[tracked]
+            # drop the oldest cell of full windows
+            full = self.recent_len[tracked] == self.loop_window
+            dropping, oldest = tracked[full], self.recent_positions[tracked[full], head[full]]
+            self.visit_counts[dropping, oldest] -= 1
+            self.recent_unique[dropping] -= self.visit_counts[dropping, oldest] == 0
+            self.recent_len[tracked[~full]] += 1
+
+            cell_id = self.agent_pos[tracked, 0] * cols + self.agent_pos[tracked, 1]
+            self.recent_positions[tracked, head] = cell_id
+            self.recent_head[tracked] = (head + 1) % self.loop_window
+            self.recent_unique[tracked] += self.visit_counts[tracked, cell_id] == 0
+            self.visit_counts[tracked, cell_id] += 1
+
+            full = tracked[self.recent_len[tracked] >= self.loop_window]
+            if len(full):
+                looping = full[self.recent_unique[full] <= self.loop_max_unique]
+                reward[looping] = -1
+                truncated[looping] = True
+                result[looping] = OSCILLATION
+                active[looping] = False
+
+        ar, ac = self.agent_pos[:, 0], self.agent_pos[:, 1]
+        here = self.cells[env_index, ar, ac]
+
+        # Collision with reward
+        collected = active & (here & REWARD != 0)
+        reward[collected] += 0.1
+        self.cells[collected, ar[collected], ac[collected]] &= ~REWARD
+        self.collected_reward_count += collected
+
+        # Collision with enemy
+        died = active & (here & ENEMY != 0)
+        reward[died] -= 1
+        terminated |= died
+        result[died] = DIED
+        active &= ~died
+
+        # Collision with reset tile (poison)
+        poisoned = active & (here & POISON != 0)
+        self.cells[poisoned, ar[poisoned], ac[poisoned]] &= ~POISON
+        self.hit_reset_count += poisoned
+        reward[poisoned] -= 1
+        terminated |= poisoned
+        result[poisoned] = DIED
+        active &= ~poisoned
+
+        # Win condition
+        won = active & (ar == self.win_tile[0]) & (ac == self.win_tile[1])
+        if won.any():
+            win_reward = (1 + self.collected_reward_count + self.enemy_killed).astype(np.float64)
+            penalized = won & ~self.omit_step_penalty
+            win_reward[penalized] -= 0.01 * self.step_count[penalized]
+            reward[won] = win_reward[won]
+            terminated |= won
+            result[won] = SUCCESS
+            active &= ~won
+            for i in np.flatnonzero(won):
+                self.envs[i]._register_success()
+
+        # Timeout
+        timeout = active & (self.step_count >= 150)
+        reward[timeout] -= 1
+        truncated |= timeout
+        result[timeout] = TIMEOUT
+
+        obs = self._get_obs()
+        infos = {}
+        if result.any():
+            infos["result"] = np.array([RESULTS[code] for code in result], dtype=object)
+            infos["_result"] = result != NO_RESULT
+
+        # Same-step autoreset, the final observation goes to info like in SyncVectorEnv
+        done = np.flatnonzero(terminated | truncated)
+        if len(done):
+            final_obs = np.empty(n, dtype=object)
+            final_info = np.empty(n, dtype=object)
+            for i in done:
+                final_obs[i] = obs[i].copy()
+                final_info[i] = {"result": RESULTS[result[i]]} if result[i] else {}
+                self._reset_env(i)
+            infos["final_obs"] = final_obs
+            infos["_final_obs"] = terminated | truncated
+            infos["final_info"] = final_info
+            infos["_final_info"] = terminated | truncated
+            obs = self._get_obs()
+
+        return obs, reward, terminated, truncated, self._mask_info(infos)
+
+    def close_extras(self, **kwargs):
+        for env in self.envs:
+            env.close()
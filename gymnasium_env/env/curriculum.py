@@ -0,0 +1,94 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# every this many successes the spawn moves one start further from the goal
+SUCCESSES_PER_LEVEL = 5
+
+
+class Curriculum:
+    """Curriculum progress of one GridWorldEnv, counted in successful episodes."""
+
+    def __init__(self):
+        self._successes = 0
+
+    @property
+    def total_successes(self):
+        return self._successes
+
+    @property
+    def level(self):
+        return self.total_successes // SUCCESSES_PER_LEVEL
+
+    @property
+    def episode_successes(self):
+        # successes since the last level up
+        return self.total_successes % SUCCESSES_PER_LEVEL
+
+    def record_success(self):
+        self._successes += 1
+
+
+class SharedCurriculum(Curriculum):
+    """Curriculum whose counters live in shared memory, so all workers see the same level.
+
+    The block holds one success counter per worker. A worker only ever adds to its
+    own slot and readers sum all slots, so updates need no lock and step() is never
+    serialized. The creating process owns the block:
+
+        curriculum = SharedCurriculum(num_workers)
+        env_fns = [lambda rank=rank: GridWorldEnv(path, curriculum=curriculum.worker(rank)) for rank in range(num_workers)]
+        ...
+        curriculum.unlink()
+
+    Worker views pickle by block name, so they can be handed to subprocess workers.
+    """
+
+    def __init__(self, num_workers, name=None, slot=0, create=True):
+        self.num_workers = num_workers
+        self.slot = slot
+        self._owner = create
+        size = num_workers * np.dtype(np.int64).itemsize
+        if create:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._counts = np.ndarray((num_workers,), dtype=np.int64, buffer=self._shm.buf)
+        if create:
+            self._counts[:] = 0
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def worker(self, slot):
+        "view of the same counters that records successes into the given slot"
+        assert 0 <= slot < self.num_workers, f"slot {slot} out of range"
+        view = SharedCurriculum.__new__(SharedCurriculum)
+        view.num_workers, view.slot, view._owner = self.num_workers, slot, False
+        view._shm, view._counts = self._shm, self._counts
+        return view
+
+    @property
+    def total_successes(self):
+        return int(self._counts.sum())
+
+    def record_success(self):
+        self._counts[self.slot] += 1
+
+    def __getstate__(self):
+        return {"name": self.name, "num_workers": self.num_workers, "slot": self.slot}
+
+    def __setstate__(self, state):
+        self.__init__(state["num_workers"], name=state["name"], slot=state["slot"], create=False)
+
+    def close(self):
+        self._counts = None
+        self._shm.close()
+
+    def unlink(self):
+        # frees the block, only for the process that created it
+        assert self._owner, "only the creating process unlinks the shared curriculum"
+        self.close()
+        self._shm.unlink()
+
@@ -0,0 +1,70 @@
+import numpy as np
+
+from .occupancy import DANGER, ENEMY_BLOCKERS
+
+# Index matches the low level actions 0-3, same order the enemies try their neighbours
+DIRECTIONS = np.array([(-1, 0), (1, 0), (0, -1), (0, 1)])
+
+# up to this many enemies the plain loop is cheaper than the array rounds
+SEQUENTIAL_MAX_ENEMIES = 32
+
+
+def telegraph_moves(cells, env_ids, positions, draws):
+    """Picks the next tile of every enemy at once and marks it DANGER in cells.
+
+    cells is a stack of occupancy grids (envs, rows, cols), enemy n lives in
+    cells[env_ids[n]] at positions[n] and picks its tile with the uniform
+    draws[n]. The result equals handling the enemies one by one in the given
+    order, each choosing floor(draw * count) among the in-bounds neighbours not
+    blocked for enemies, including tiles reserved by the enemies before it.
+
+    The order only matters where enemies share a candidate tile: enemies with no
+    earlier enemy competing for their tiles are settled together in one array
+    pass, the contested rest then go one by one. Returns the targets (n, 2), an
+    enemy without a free neighbour keeps its position.
+    """
+    count = len(positions)
+    targets = positions.copy()
+    if count <= SEQUENTIAL_MAX_ENEMIES:
+        return _telegraph_sequential(cells, env_ids, positions, draws, targets)
+
+    envs, rows, cols = cells.shape
+    neighbors = positions[:, None, :] + DIRECTIONS
+    in_bounds = ((neighbors >= 0) & (neighbors < (rows, cols))).all(axis=2)
+    # flat cell index over the whole stack, so enemies of different envs never meet
+    flat = (env_ids[:, None] * rows + neighbors[..., 0]) * cols + neighbors[..., 1]
+    flat[~in_bounds] = 0
+    cells_flat = cells.reshape(-1)
+    free = in_bounds & (cells_flat[flat] & ENEMY_BLOCKERS == 0)
+
+    # lowest enemy index wanting each tile, contested = an earlier enemy wants one of ours
+    order = np.broadcast_to(np.arange(count)[:, None], flat.shape)
+    first_claim = np.full(cells_flat.shape, count, dtype=np.int64)
+    np.minimum.at(first_claim, flat[free], order[free])
+    contested = (free & (first_claim[flat] < order)).any(axis=1)
+
+    options = free.sum(axis=1)
+    movers = np.flatnonzero(~contested & (options > 0))
+    picks = (draws[movers] * options[movers]).astype(np.int64)
+    direction = np.argmax(np.cumsum(free[movers], axis=1) > picks[:, None], axis=1)
+    targets[movers] = neighbors[movers, direction]
+    cells_flat[flat[movers, direction]] |= DANGER
+
+    rest = np.flatnonzero(contested)
+    targets[rest] = _telegraph_sequential(cells, env_ids[rest], positions[rest], draws[rest], targets[rest])
+    return targets
+
+
+def _telegraph_sequential(cells, env_ids, positions, draws, targets):
+    envs, rows, cols = cells.shape
+    for n, (env, (r, c), draw) in enumerate(zip(env_ids.tolist(), positions.tolist(), draws.tolist())):
+        grid = cells[env]
+        free = [
+            (nr, nc) for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1))
+            if 0 <= nr < rows and 0 <= nc < cols and not grid[nr, nc] & ENEMY_BLOCKERS
+        ]
+        if free:
+            target = free[int(draw * len(free))]
+            targets[n] = target
+            grid[target] |= DANGER
+    return targets
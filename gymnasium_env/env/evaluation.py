@@ -0,0 +1,141 @@
+import math
+
+import numpy as np
+from gymnasium import Wrapper
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+
+from .base_env import GridWorldEnv
+from .curriculum import SharedCurriculum
+
+# info["result"] of the last step of an episode -> reported outcome
+OUTCOMES = {
+    "success": "success",
+    "u died": "death",
+    "timeout": "timeout",
+    "stuck_same_tile": "stuck",
+    "oscillation/loop_stuck": "oscillation",
+}
+OUTCOME_NAMES = ["success", "death", "timeout", "stuck", "oscillation", "other"]
+
+
+def outcome(result):
+    if result in OUTCOMES:
+        return OUTCOMES[result]
+    if result is not None and result.endswith("_stuck"):
+        # high level fallback when no action is possible, e.g. "no_path_to_goal_stuck"
+        return "stuck"
+    return "other"
+
+
+class ResetOptions(Wrapper):
+    """Passes fixed GridWorldEnv.reset arguments (force_furthest, test_emptiness, ...) to every reset.
+
+    VecEnvs reset finished envs on their own without arguments, this keeps the
+    test options for those resets too. options given to reset() override them.
+    """
+
+    def __init__(self, env, **reset_kwargs):
+        super().__init__(env)
+        self.reset_kwargs = reset_kwargs
+
+    def reset(self, *, seed=None, options=None):
+        return self.env.reset(seed=seed, **{**self.reset_kwargs, **(options or {})})
+
+
+def _make_env(layout_path, curriculum, reset_kwargs):
+    def make():
+        env = GridWorldEnv(layout_path, render_mode="rgb_array", curriculum=curriculum)
+        return ResetOptions(env, **reset_kwargs)
+    return make
+
+
+def run_episodes(model, layout_path, episodes=50, workers=4, reset_kwargs=None, seed=0, deterministic=True, use_masks=False):
+    """Plays episodes of a trained model on workers envs in subprocesses, without rendering.
+
+    Every tick the observations of all envs go through one model.predict call.
+    Env i plays (episodes + i) // workers episodes, so fast envs don't fill the
+    sample with short episodes. The envs share one SharedCurriculum, so starts
+    advance with the successes like in a single sequentially tested env.
+    use_masks passes info["action_mask"] to predict, for MaskablePPO models.
+    Returns one {"result", "outcome", "steps", "reward"} dict per episode.
+    """
+    reset_kwargs = reset_kwargs or {}
+    curriculum = SharedCurriculum(workers)
+    vec_env = None
+    try:
+        env_fns = [_make_env(layout_path, curriculum.worker(rank), reset_kwargs) for rank in range(workers)]
+        vec_env = DummyVecEnv(env_fns) if workers == 1 else SubprocVecEnv(env_fns)
+        vec_env.seed(seed)
+        obs = vec_env.reset()
+        masks = np.stack([info["action_mask"] for info in vec_env.reset_infos])
+
+        targets = np.array([(episodes + i) // workers for i in range(workers)])
+        counts = np.zeros(workers, dtype=np.int64)
+        returns = np.zeros(workers)
+        lengths = np.zeros(workers, dtype=np.int64)
+        results = []
+        while (counts < targets).any():
+            if use_masks:
+                actions, _ = model.predict(obs, deterministic=deterministic, action_masks=masks)
+            else:
+                actions, _ = model.predict(obs, deterministic=deterministic)
+            obs, rewards, dones, infos = vec_env.step(actions)
+            returns += rewards
+            lengths += 1
+
+            for i in np.flatnonzero(dones):
+                if counts[i] < targets[i]:
+                    result = infos[i].get("result")
+                    results.append({
+                        "result": result,
+                        "outcome": outcome(result),
+                        "steps": int(lengths[i]),
+                        "reward": float(returns[i]),
+                    })
+                    counts[i] += 1
+                returns[i] = 0
+                lengths[i] = 0
+            # a finished env already runs its next episode, its mask comes from the reset
+            masks = np.stack([
+                (vec_env.reset_infos[i] if done else info)["action_mask"]
+                for i, (done, info) in enumerate(zip(dones, infos))
+            ])
+    finally:
+        if vec_env is not None:
+            vec_env.close()
+        curriculum.unlink()
+    return results
+
+
+def wilson_interval(successes, n, z=1.96):
+    "confidence interval of a rate, stays inside [0, 1] also for rates near 0 or 1"
+    if n == 0:
+        return 0.0, 0.0
+    rate = successes / n
+    denominator = 1 + z * z / n
+    center = (rate + z * z / (2 * n)) / denominator
+    half = z * math.sqrt(rate * (1 - rate) / n + z * z / (4 * n * n)) / denominator
+    return max(center - half, 0.0), min(center + half, 1.0)
+
+
+def mean_interval(values, z=1.96):
+    "mean and its normal confidence interval"
+    values = np.asarray(values, dtype=np.float64)
+    mean = float(values.mean())
+    if len(values) < 2:
+        return mean, mean, mean
+    half = z * float(values.std(ddof=1)) / math.sqrt(len(values))
+    return mean, mean - half, mean + half
+
+
+def summarize(results, z=1.96):
+    "outcome rates, mean steps and mean reward of run_episodes results, each as (value, low, high)"
+    n = len(results)
+    outcomes = [result["outcome"] for result in results]
+    summary = {"episodes": n, "rates": {}}
+    for name in OUTCOME_NAMES:
+        count = outcomes.count(name)
+        summary["rates"][name] = (count / n if n else 0.0, *wilson_interval(count, n, z))
+    summary["steps"] = mean_interval([result["steps"] for result in results], z)
+    summary["reward"] = mean_interval([result["reward"] for result in results], z)
+    return summary
@@ -0,0 +1,140 @@
+import multiprocessing
+
+import numpy as np
+
+# Symbols of layout_loader.TILE_SYMBOLS as byte values, the grid is built as an ascii array
+EMPTY, WALL, START, GOAL, POISON, BONUS, RUBBLE, ENEMY, RANDOM = b".#SGRBEMA"
+
+# placements of rewards, enemies and random tiles tried on one map before it is redrawn
+PLACEMENT_ATTEMPTS = 10
+
+
+def connected_components(passable):
+    """Labels 4-connected regions of passable cells, -1 for the rest.
+
+    Works on the whole grid at once: every round hooks the larger label of each
+    edge whose ends disagree onto the smaller one, then pointer jumping flattens
+    the label trees. A region ends up labelled with its smallest flat index.
+    """
+    rows, cols = passable.shape
+    flat = passable.ravel()
+    index = np.arange(flat.size).reshape(rows, cols)
+    horizontal = passable[:, :-1] & passable[:, 1:]
+    vertical = passable[:-1, :] & passable[1:, :]
+    a = np.concatenate((index[:, :-1][horizontal], index[:-1, :][vertical]))
+    b = np.concatenate((index[:, 1:][horizontal], index[1:, :][vertical]))
+
+    labels = np.arange(flat.size)
+    while True:
+        la, lb = labels[a], labels[b]
+        differ = la != lb
+        if not differ.any():
+            break
+        np.minimum.at(labels, np.maximum(la, lb)[differ], np.minimum(la, lb)[differ])
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+
+    labels[~flat] = -1
+    return labels.reshape(rows, cols)
+
+
+def _pick(rng, cells, count):
+    # count distinct cells out of the (n, 2) array cells, in random order
+    if count > len(cells):
+        return None
+    return cells[rng.choice(len(cells), size=count, replace=False)]
+
+
+def generate_layout(
+    size, wall_density=0.2, rubble=0, poison=0, rewards=0, enemies=0, random_tiles=0,
+    starts=4, min_start_distance=0, max_start_distance=None, rng=None, max_attempts=100
+):
+    """Generates a solvable layout as a list of rows in the layout file format.
+
+    size is the side of a square map or (rows, cols). The map gets a wall border,
+    interior walls at wall_density and the given numbers of rubble, poison, reward,
+    enemy and random ('A') tiles. The goal and all starts lie in one region that is
+    connected without crossing walls, rubble or poison, with every start at a
+    Manhattan distance to the goal within [min_start_distance, max_start_distance].
+    Rewards, enemies and random tiles are put into that region too. A random tile
+    may become poison at reset, so every start still has to reach the goal with all
+    of them counted as blockers. Candidates that can't satisfy this are rejected and
+    redrawn, after max_attempts a ValueError is raised.
+    """
+    rng = np.random.default_rng(rng)
+    rows, cols = (size, size) if np.isscalar(size) else size
+    if max_start_distance is None:
+        max_start_distance = rows + cols
+
+    for _ in range(max_attempts):
+        grid = np.full((rows, cols), EMPTY, dtype=np.uint8)
+        grid[0, :] = grid[-1, :] = grid[:, 0] = grid[:, -1] = WALL
+        inner = grid[1:-1, 1:-1]
+        inner[rng.random(inner.shape) < wall_density] = WALL
+
+        # tiles that block paths go first, the region is then searched around them
+        free = np.argwhere(grid == EMPTY)
+        blockers = _pick(rng, free, rubble + poison)
+        if blockers is None:
+            continue
+        grid[blockers[:rubble, 0], blockers[:rubble, 1]] = RUBBLE
+        grid[blockers[rubble:, 0], blockers[rubble:, 1]] = POISON
+
+        labels = connected_components(grid == EMPTY)
+        sizes = np.bincount(labels[labels >= 0])
+        if not len(sizes):
+            continue
+        in_region = labels == sizes.argmax()
+        region = np.argwhere(in_region)
+
+        goal = region[rng.integers(len(region))]
+        distance = np.abs(region - goal).sum(axis=1)
+        start_cells = region[(distance >= max(min_start_distance, 1)) & (distance <= max_start_distance)]
+        start_cells = _pick(rng, start_cells, starts)
+        if start_cells is None:
+            continue
+        grid[goal[0], goal[1]] = GOAL
+        grid[start_cells[:, 0], start_cells[:, 1]] = START
+
+        free = np.argwhere(in_region & (grid == EMPTY))
+        # a placement that cuts a start off the goal is drawn again, a few times before the whole map is
+        for _ in range(PLACEMENT_ATTEMPTS):
+            objects = _pick(rng, free, rewards + enemies + random_tiles)
+            if objects is None:
+                break
+            placed_grid = grid.copy()
+            for symbol, placed in zip((BONUS, ENEMY, RANDOM), np.split(objects, [rewards, rewards + enemies])):
+                placed_grid[placed[:, 0], placed[:, 1]] = symbol
+            if random_tiles:
+                labels = connected_components(in_region & (placed_grid != RANDOM))
+                if (labels[start_cells[:, 0], start_cells[:, 1]] != labels[goal[0], goal[1]]).any():
+                    continue
+            return [row.tobytes().decode("ascii") for row in placed_grid]
+
+    raise ValueError(f"no solvable {rows}x{cols} layout in {max_attempts} attempts")
+
+
+def save_layout(path, layout):
+    with open(path, "w") as f:
+        f.write("\n".join(layout) + "\n")
+
+
+def _generate_chunk(args):
+    seed, count, params = args
+    rng = np.random.default_rng(seed)
+    return [generate_layout(rng=rng, **params) for _ in range(count)]
+
+
+def generate_layouts(count, workers=None, seed=None, chunk_size=16, **params):
+    "count layouts from generate_layout(**params) made in worker processes, reproducible for a given seed"
+    chunks = [min(chunk_size, count - start) for start in range(0, count, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    tasks = [(chunk_seed, chunk, params) for chunk_seed, chunk in zip(seeds, chunks)]
+    if workers == 1:
+        results = map(_generate_chunk, tasks)
+        return [layout for chunk in results for layout in chunk]
+    with multiprocessing.Pool(workers) as pool:
+        return [layout for chunk in pool.imap(_generate_chunk, tasks) for layout in chunk]
@@ -1,4 +1,8 @@
-import random
+import os
+
+import numpy as np
+
+from .occupancy import POISON, REWARD, ENEMY, build_occupancy
 
 TILE_SYMBOLS = {
     '#': 'wall',
@@ -11,6 +15,13 @@ TILE_SYMBOLS = {
     'A': 'random_tile'
 }
 
+# What a random tile ('A') can turn into and how likely, when it isn't left empty
+RANDOM_TILE_FLAGS = np.array([POISON, REWARD, ENEMY], dtype=np.uint8)
+RANDOM_TILE_WEIGHTS = np.array([0.3, 0.6, 0.1])
+
+# compiled layouts keyed by (path, mtime), so editing a layout file recompiles it
+_TEMPLATE_CACHE = {}
+
 def load_layout(file_path):
     "loads chars from txt file"
     with open(file_path, 'r') as f:
@@ -19,57 +30,78 @@ def load_layout(file_path):
 def get_tile_type(symbol):
     return TILE_SYMBOLS.get(symbol)
 
-def parse_layout(grid, episode_successes, map_emptiness):
-    DMG_TILES = []
-    REWARD_TILES = []
-    WALL_TILES = []
-    RUBBLE_TILES = []
-    START_POSITIONS = []
-    ENEMY_POSITIONS = []
-    WIN_TILE = None
+def compile_layout(file_path):
+    "parses a layout file once into numpy templates, random tiles are left for materialize_layout"
+    key = (os.path.abspath(file_path), os.path.getmtime(file_path))
+    template = _TEMPLATE_CACHE.get(key)
+    if template is not None:
+        return template
 
-    random_tile_targets = ['reset', 'bonus', 'enemy']
-    random_weights = [0.3, 0.6, 0.1]
+    grid = load_layout(file_path)
+    rows, cols = len(grid), len(grid[0])
+    assert all(len(row) == cols for row in grid), "Layout must be rectangular"
 
+    static = {
+        "WALL_TILES": [],
+        "START_POSITIONS": [],
+        "WIN_TILE": None,
+        "DMG_TILES": [],
+        "REWARD_TILES": [],
+        "RUBBLE_TILES": [],
+        "ENEMY_POSITIONS": [],
+    }
+    keys = {
+        'wall': "WALL_TILES",
+        'start': "START_POSITIONS",
+        'reset': "DMG_TILES",
+        'bonus': "REWARD_TILES",
+        'rubble': "RUBBLE_TILES",
+        'enemy': "ENEMY_POSITIONS",
+    }
+    random_tiles = []
+    for r, row in enumerate(grid):
+        for c, symbol in enumerate(row):
+            tile_type = get_tile_type(symbol)
+            if tile_type == 'random_tile':
+                random_tiles.append((r, c))
+            elif tile_type == 'goal':
+                static["WIN_TILE"] = (r, c)
+            elif tile_type in keys:
+                static[keys[tile_type]].append((r, c))
+
+    template = {
+        "grid": grid,
+        "grid_size": (rows, cols),
+        "cells": build_occupancy((rows, cols), static),
+        "WALL_TILES": tuple(static["WALL_TILES"]),
+        "RUBBLE_TILES": tuple(static["RUBBLE_TILES"]),
+        "START_POSITIONS": static["START_POSITIONS"],
+        "WIN_TILE": static["WIN_TILE"],
+        "random_tiles": np.array(random_tiles, dtype=np.int64).reshape(-1, 2),
+        "max_enemies": len(static["ENEMY_POSITIONS"]) + len(random_tiles),
+    }
+    _TEMPLATE_CACHE[key] = template
+    return template
+
+def materialize_layout(template, episode_successes, map_emptiness, rng=None):
+    "returns a fresh occupancy grid of the template with its random tiles drawn at once"
     # Update emptiness level based on curriculum
     if episode_successes > 1500:
         map_emptiness = 0.2
     elif episode_successes > 500:
         map_emptiness = 0.5
 
-    for r, row in enumerate(grid):
-        for c, symbol in enumerate(row):
-            pos = (r, c)
-            tile_type = get_tile_type(symbol)
-
-            # makes the map more empty by not assinging a type to a random tile thus leaving it empty
-            if tile_type == 'random_tile':
-                if random.random() < map_emptiness:
-                    continue
-                tile_type = random.choices(random_tile_targets, weights=random_weights, k=1)[0]
+    if rng is None:
+        rng = np.random.default_rng()
 
-            if tile_type == 'wall':
-                WALL_TILES.append(pos)
-            elif tile_type == 'start':
-                START_POSITIONS.append(pos)
-            elif tile_type == 'goal':
-                WIN_TILE = pos
-            elif tile_type == 'reset':
-                DMG_TILES.append(pos)
-            elif tile_type == 'bonus':
-                REWARD_TILES.append(pos)
-            elif tile_type == 'rubble':
-                RUBBLE_TILES.append(pos)
-            elif tile_type == 'enemy':
-                ENEMY_POSITIONS.append(pos)
+    cells = template["cells"].copy()
+    random_tiles = template["random_tiles"]
+    if len(random_tiles):
+        # one uniform pair per tile: below map_emptiness leaves it empty, otherwise it picks the type
+        draws = rng.random((len(random_tiles), 2))
+        cumulative = np.cumsum(RANDOM_TILE_WEIGHTS) / RANDOM_TILE_WEIGHTS.sum()
+        types = np.minimum(np.searchsorted(cumulative, draws[:, 1], side="right"), len(cumulative) - 1)
+        flags = np.where(draws[:, 0] < map_emptiness, 0, RANDOM_TILE_FLAGS[types]).astype(np.uint8)
+        cells[random_tiles[:, 0], random_tiles[:, 1]] |= flags
 
-    return {
-        "WALL_TILES": WALL_TILES,
-        "START_POSITIONS": START_POSITIONS,
-        "WIN_TILE": WIN_TILE,
-        "DMG_TILES": DMG_TILES,
-        "REWARD_TILES": REWARD_TILES,
-        "RUBBLE_TILES": RUBBLE_TILES,
-        "ENEMY_POSITIONS": ENEMY_POSITIONS,
-        "map_emptiness": map_emptiness
-    }
\ No newline at end of file
+    return cells, map_emptiness
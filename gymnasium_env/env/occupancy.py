@@ -0,0 +1,52 @@
+import numpy as np
+
+# Cell flags of the occupancy grid, one cell can hold several of them
+WALL = np.uint8(1)
+RUBBLE = np.uint8(2)
+POISON = np.uint8(4)
+REWARD = np.uint8(8)
+ENEMY = np.uint8(16)
+DANGER = np.uint8(32)
+GOAL = np.uint8(64)
+
+# What stops the agent, the pathfinding and the enemies
+AGENT_BLOCKERS = WALL | RUBBLE
+PATH_BLOCKERS = WALL | RUBBLE | POISON
+ENEMY_BLOCKERS = WALL | RUBBLE | POISON | ENEMY | DANGER
+
+
+def _build_obs_lut():
+    # observation value for every flag combination, earlier entries win
+    priority = [(GOAL, 2.0), (POISON, 3.0), (REWARD, 4.0), (WALL, 5.0), (RUBBLE, 6.0), (ENEMY, 7.0), (DANGER, 8.0)]
+    lut = np.zeros(128, dtype=np.float32)
+    for flags in range(128):
+        for flag, value in priority:
+            if flags & flag:
+                lut[flags] = value
+                break
+    return lut
+
+
+# obs value of a cell = OBS_LUT[flags], the agent (1.0) is written on top
+OBS_LUT = _build_obs_lut()
+
+
+def build_occupancy(grid_size, layout_data):
+    cells = np.zeros(grid_size, dtype=np.uint8)
+    for key, flag in (
+        ("WALL_TILES", WALL),
+        ("RUBBLE_TILES", RUBBLE),
+        ("DMG_TILES", POISON),
+        ("REWARD_TILES", REWARD),
+        ("ENEMY_POSITIONS", ENEMY),
+    ):
+        for pos in layout_data[key]:
+            cells[pos] |= flag
+    if layout_data["WIN_TILE"] is not None:
+        cells[layout_data["WIN_TILE"]] |= GOAL
+    return cells
+
+
+def tiles_with(cells, flag):
+    # positions holding flag in row-major order, same order as parse_layout lists them
+    return tuple(map(tuple, np.argwhere(cells & flag).tolist()))
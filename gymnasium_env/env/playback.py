@@ -0,0 +1,106 @@
+import time
+
+import pygame
+
+from config import FPS
+
+PAUSED_FPS = 30  # the window keeps redrawing while paused, so it stays responsive
+
+
+class PlaybackController:
+    """Paces stepping and rendering of a human mode GridWorldEnv.
+
+    Call tick() before every env.step(). speed is in env steps per second,
+    None runs as fast as possible, and only every render_every-th step is
+    drawn. With display_fps the env steps at full speed and the window shows
+    the latest state display_fps times a second, speed and render_every are
+    then not used. The renderer's own FPS limit is turned off, the
+    controller does the pacing. Closing the window stops the playback
+    instead of ending the process, so the caller can still clean up.
+
+    Keys: space pauses/resumes, right arrow or n makes one step while paused,
+    up/down double/halve the speed, u switches the speed limit off and on,
+    escape or closing the window stops the playback.
+    """
+
+    def __init__(self, env, speed=FPS, render_every=1, display_fps=None):
+        self.env = env
+        self.renderer = env.unwrapped.renderer
+        self.renderer.fps = 0
+        self.renderer.exit_on_quit = False
+        self.speed = speed
+        self._limited_speed = speed or FPS  # restored by u
+        self.render_every = max(1, render_every)
+        self.display_fps = display_fps
+        self.paused = False
+        self.stopped = False
+        self._step_once = False
+        self._steps = 0
+        self._next_step = time.perf_counter()
+        self._last_frame = float("-inf")
+
+    def tick(self):
+        "renders and waits as set up, returns False once the playback was stopped"
+        now = time.perf_counter()
+        if self.display_fps:
+            if now - self._last_frame >= 1 / self.display_fps:
+                self._render(now)
+        elif self._steps % self.render_every == 0:
+            self._render(now)
+
+        while self.paused and not self._step_once and not self.stopped:
+            time.sleep(1 / PAUSED_FPS)
+            self._render(time.perf_counter())
+        self._step_once = False
+
+        if self.speed and not self.display_fps and not self.paused:
+            self._next_step += 1 / self.speed
+            delay = self._next_step - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -0.25:
+                # far behind after a slow step or a pause, don't run the missed steps in a burst
+                self._next_step = time.perf_counter()
+        else:
+            self._next_step = time.perf_counter()
+        self._steps += 1
+        return not self.stopped
+
+    def _render(self, now):
+        # keys are only read here, from the events the renderer took from the queue while drawing
+        self.env.render()
+        self._last_frame = now
+        self._handle(self.renderer.events)
+        self.renderer.events = []
+
+    def _handle(self, events):
+        for event in events:
+            if event.type == pygame.QUIT:
+                self.stopped = True
+            elif event.type != pygame.KEYDOWN:
+                continue
+            elif event.key == pygame.K_ESCAPE:
+                self.stopped = True
+            elif event.key == pygame.K_SPACE:
+                self.paused = not self.paused
+            elif event.key in (pygame.K_RIGHT, pygame.K_n):
+                self._step_once = self.paused
+            elif event.key == pygame.K_UP and self.speed:
+                self.speed = self._limited_speed = self.speed * 2
+            elif event.key == pygame.K_DOWN and self.speed:
+                self.speed = self._limited_speed = self.speed / 2
+            elif event.key == pygame.K_u:
+                self.speed = None if self.speed else self._limited_speed
+            else:
+                continue
+            pygame.display.set_caption(f"Grid World - {self.status()}")
+
+    def status(self):
+        if self.stopped:
+            return "stopped"
+        if self.paused:
+            return "paused"
+        if self.display_fps:
+            return f"full speed, display {self.display_fps} fps"
+        speed = f"{self.speed:g} steps/s" if self.speed else "unbounded"
+        return speed if self.render_every == 1 else f"{speed}, every {self.render_every}. step drawn"
@@ -0,0 +1,409 @@
+import itertools
+import json
+import operator
+import os
+
+import numpy as np
+from gymnasium import Wrapper
+
+from .base_env import FACINGS
+from .occupancy import POISON, REWARD, ENEMY, DANGER
+
+_FACING_INDEX = {facing: index for index, facing in enumerate(FACINGS)}
+
+# values a step stages for every step, see TrajectoryRecorder.step
+STAGED_FIELDS = 5
+
+
+def step_dtype():
+    "one recorded step: the action, its outcome and the compact state after it"
+    return np.dtype([
+        ("episode", np.int32),
+        ("t", np.int32),
+        ("action", np.int8),
+        ("reward", np.float32),
+        ("terminated", np.bool_),
+        ("truncated", np.bool_),
+        ("result", np.int8),  # index into the results list of meta.json, 0 = no result
+        ("agent_pos", np.int16, 2),
+        ("agent_facing", np.int8),  # index into FACINGS
+        ("cleared", np.uint8),  # REWARD/POISON flags the agent removed from its cell
+        # index of the first enemy/danger tile in the positions files, steps with the same enemies or danger tiles share them
+        ("enemy_start", np.int64),
+        ("danger_start", np.int64),
+        ("enemy_count", np.int16),
+        ("danger_count", np.int16),
+        ("attack_count", np.int8),
+        ("attack_pos", np.int16, (2, 2)),  # tiles hit by an attack this step
+    ])
+
+
+def episode_dtype(grid_size, max_enemies):
+    "one recorded episode: where its steps are and the state right after reset"
+    return np.dtype([
+        ("start", np.int64),
+        ("length", np.int32),
+        ("result", np.int8),
+        ("cells", np.uint8, grid_size),
+        ("agent_pos", np.int16, 2),
+        ("agent_facing", np.int8),
+        ("enemy_count", np.int16),
+        ("enemy_pos", np.int16, (max_enemies, 2)),
+    ])
+
+
+def _with_entities(cells, enemies, danger):
+    grid = cells.copy()
+    grid[danger[:, 0], danger[:, 1]] |= DANGER
+    grid[enemies[:, 0], enemies[:, 1]] |= ENEMY
+    return grid
+
+
+class _ChunkedArray:
+    """Record array stored as fixed size .npy memmap chunks, written front to back."""
+
+    def __init__(self, directory, prefix, dtype, chunk_size, record_shape=()):
+        self.directory = directory
+        self.prefix = prefix
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+        self.record_shape = record_shape
+        self._index = None
+        self._memmap = None
+        self._chunk = None
+
+    def _open(self, index):
+        # only the newest chunk is kept open, writes never go back to older ones
+        if index != self._index:
+            self.flush()
+            path = os.path.join(self.directory, f"{self.prefix}_{index:05d}.npy")
+            self._memmap = np.lib.format.open_memmap(path, mode="w+", dtype=self.dtype, shape=(self.chunk_size,) + self.record_shape)
+            # a plain ndarray view skips the memmap subclass bookkeeping on every access
+            self._chunk = self._memmap.view(np.ndarray)
+            self._index = index
+        return self._chunk
+
+    def record(self, index):
+        "writable view of one record"
+        chunk, row = divmod(index, self.chunk_size)
+        return self._open(chunk)[row]
+
+    def write(self, start, records):
+        # numpy copies structured records field by field, as raw bytes they are one memcpy
+        as_bytes = np.dtype((np.void, self.dtype.itemsize)) if self.dtype.names else self.dtype
+        records = records.view(as_bytes)
+        while len(records):
+            chunk, row = divmod(start, self.chunk_size)
+            take = min(len(records), self.chunk_size - row)
+            self._open(chunk)[row:row + take].view(as_bytes)[...] = records[:take]
+            start += take
+            records = records[take:]
+
+    def flush(self):
+        if self._memmap is not None:
+            self._memmap.flush()
+
+
+class TrajectoryRecorder(Wrapper):
+    """Records every step of a GridWorldEnv into chunked memory-mapped .npy files.
+
+    The directory gets steps_*.npy (step_dtype records), positions_*.npy
+    (the enemy and danger tiles of the steps, one after another), episodes_*.npy
+    (episode_dtype records with the layout right after reset) and meta.json
+    with the counts and the result names. A step only stages the values and
+    the references to the lists the env already has. They are converted and
+    written to the memmaps block_steps at a time. Data is visible to
+    TrajectoryReader after flush() or close().
+
+    Recording costs about 1 us per step (benchmark.py --recorder). That is
+    under 5% for steps from about 20 us up (high level actions, enemies on
+    big maps) but 10-15% for the fastest low level steps of about 9 us.
+    """
+
+    def __init__(self, env, directory, chunk_steps=1 << 16, chunk_episodes=1 << 12, chunk_positions=1 << 18, block_steps=1024):
+        super().__init__(env)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        base = self._base = env.unwrapped
+        self.grid_size = base.grid_size
+        self.max_enemies = base.layout["max_enemies"]
+        self.block_steps = block_steps
+        self.steps = _ChunkedArray(directory, "steps", step_dtype(), chunk_steps)
+        # (row, col) of enemy and danger tiles
+        self.positions = _ChunkedArray(directory, "positions", np.int16, chunk_positions, record_shape=(2,))
+        self.episodes = _ChunkedArray(directory, "episodes", episode_dtype(self.grid_size, self.max_enemies), chunk_episodes)
+        self.results = [None]
+        self._result_codes = {None: 0}
+
+        self.episode_count = 0
+        self._written = 0  # steps already in the memmaps
+        self._positions = 0  # enemy and danger tiles already in the memmaps
+        self._enemies = None  # the enemy list last put into the positions
+        self._enemy_start = 0
+        self._danger = None  # the danger list last put into the positions
+        self._danger_start = 0
+        self._counters = (-1, 0, 0)  # episode, collected rewards and hit poison of the last written outcome
+        self._rows = []
+        self._staged = 0
+        # (row, reward, terminated, truncated, result, collected rewards, hit poison) of the staged steps with any
+        self._outcomes = []
+        self._attacks = []  # (row, attacked tiles) of the staged steps with an attack
+        self._episode_starts = []  # (first step, episode) of the episodes with steps in the staged block
+        self._episode_result = 0
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self._close_episode()
+        base = self._base
+        record = self.episodes.record(self.episode_count)
+        self._episode_starts.append((self.step_count, self.episode_count))
+        self.episode_count += 1
+        record["start"] = self.step_count
+        record["length"] = 0
+        record["result"] = 0
+        record["cells"] = base.cells
+        record["agent_pos"] = base.agent_pos
+        record["agent_facing"] = _FACING_INDEX[base.agent_facing]
+        enemies = base._enemy_positions
+        record["enemy_count"] = len(enemies)
+        if enemies:
+            record["enemy_pos"][:len(enemies)] = enemies
+        self._episode_result = 0
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        base = self._base
+        row = self._staged
+        self._staged += 1
+        # STAGED_FIELDS values one after another. The env replaces these lists instead of changing
+        # them, so the references stay valid until the block is written
+        self._rows += (action, base.agent_pos, base.agent_facing, base._enemy_positions, base._danger_tiles)
+        # Most steps have no reward, no result and no attack, only the others stage them. Rewards and
+        # poison are only cleared on steps with a reward, so the counters go with the outcome
+        if reward or terminated or truncated or "result" in info:
+            self._outcomes.append((
+                row, reward, terminated, truncated, info.get("result"), base.collected_reward_count, base.hit_reset_count,
+            ))
+        if base.attack_highlight:
+            self._attacks.append((row, base.attack_highlight))
+        if self._staged >= self.block_steps:
+            self._write_steps()
+        return obs, reward, terminated, truncated, info
+
+    @property
+    def step_count(self):
+        "steps recorded, staged ones included"
+        return self._written + self._staged
+
+    def _result_code(self, result):
+        code = self._result_codes.get(result)
+        if code is None:
+            code = self._result_codes[result] = len(self.results)
+            self.results.append(result)
+        return code
+
+    @staticmethod
+    def _place_lists(lists, last, last_start, end):
+        """Start and length in the positions of each staged list, the new lists and the new end.
+
+        The env replaces a list to change it, a list that is the one of the step before shares its start.
+        """
+        n = len(lists)
+        new = np.fromiter(map(operator.is_not, lists, itertools.chain((last,), lists)), dtype=bool, count=n)
+        counts = np.fromiter(map(len, lists), dtype=np.int64, count=n)
+        ends = end + np.cumsum(np.where(new, counts, 0))
+        starts = np.where(new, ends - counts, -1)
+        if not new[0]:
+            starts[0] = last_start
+        return np.maximum.accumulate(starts), counts, itertools.compress(lists, new), int(ends[-1])
+
+    def _write_steps(self):
+        n = self._staged
+        if not n:
+            return
+        actions, agent_pos, facings, enemies, danger = (self._rows[i::STAGED_FIELDS] for i in range(STAGED_FIELDS))
+        block = np.zeros(n, dtype=self.steps.dtype)
+        # fromiter over plain values and flattened tuples is several times faster than np.array
+        block["action"] = np.fromiter(actions, dtype=np.int8, count=n)
+        block["agent_pos"] = np.fromiter(itertools.chain.from_iterable(agent_pos), dtype=np.int16, count=2 * n).reshape(n, 2)
+        block["agent_facing"] = np.fromiter(map(_FACING_INDEX.__getitem__, facings), dtype=np.int8, count=n)
+
+        steps = np.arange(self._written, self._written + n)
+        starts = np.array(self._episode_starts)
+        episode = np.searchsorted(starts[:, 0], steps, side="right") - 1
+        block["episode"] = starts[episode, 1]
+        block["t"] = steps - starts[episode, 0]
+
+        # rewards and poison only disappear under the agent, a counter that went up tells which one.
+        # reset zeroes the counters, so the first outcome of an episode is compared with 0
+        if self._outcomes:
+            rows, rewards, terminated, truncated, results, collected, hit_resets = zip(*self._outcomes)
+            rows = np.array(rows)
+            block["reward"][rows] = rewards
+            block["terminated"][rows] = terminated
+            block["truncated"][rows] = truncated
+            episodes = block["episode"][rows].tolist()
+            codes, cleared = [], []
+            last_episode, last_collected, last_hit_resets = self._counters
+            for episode, result, collected_now, hit_resets_now in zip(episodes, results, collected, hit_resets):
+                codes.append(0 if result is None else self._result_code(result))
+                if codes[-1] and episode == self.episode_count - 1:
+                    self._episode_result = codes[-1]
+                if episode != last_episode:
+                    last_episode, last_collected, last_hit_resets = episode, 0, 0
+                cleared.append((REWARD if collected_now > last_collected else 0) | (POISON if hit_resets_now > last_hit_resets else 0))
+                last_collected, last_hit_resets = collected_now, hit_resets_now
+            block["result"][rows] = codes
+            block["cleared"][rows] = cleared
+            self._counters = (last_episode, last_collected, last_hit_resets)
+
+        # Enemies move on odd steps and danger tiles change on even ones, so every list stays for two steps.
+        # The block's new enemy lists go into the positions first, then its new danger lists
+        enemy_start, block["enemy_count"], new_enemies, end = self._place_lists(enemies, self._enemies, self._enemy_start, self._positions)
+        danger_start, block["danger_count"], new_danger, end = self._place_lists(danger, self._danger, self._danger_start, end)
+        block["enemy_start"], block["danger_start"] = enemy_start, danger_start
+        self._enemies, self._enemy_start = enemies[-1], int(enemy_start[-1])
+        self._danger, self._danger_start = danger[-1], int(danger_start[-1])
+        if end > self._positions:
+            tiles = itertools.chain.from_iterable(itertools.chain(new_enemies, new_danger))
+            cells = np.fromiter(itertools.chain.from_iterable(tiles), dtype=np.int16, count=2 * (end - self._positions))
+            self.positions.write(self._positions, cells.reshape(-1, 2))
+            self._positions = end
+
+        if self._attacks:
+            rows, attacks = zip(*self._attacks)
+            counts = np.fromiter(map(len, attacks), dtype=np.int64, count=len(rows))
+            block["attack_count"][list(rows)] = counts
+            # the tiles of all attacks one after another, each into the next slot of its row
+            rows = np.repeat(rows, counts)
+            slots = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+            tiles = itertools.chain.from_iterable(itertools.chain.from_iterable(attacks))
+            block["attack_pos"][rows, slots] = np.fromiter(tiles, dtype=np.int16, count=2 * len(rows)).reshape(-1, 2)
+
+        self.steps.write(self._written, block)
+        self._written += n
+        self._rows, self._outcomes, self._attacks = [], [], []
+        self._staged = 0
+        self._episode_starts = self._episode_starts[-1:]
+
+    def _close_episode(self):
+        # length and result of the running episode go into its record
+        if self.episode_count:
+            start = self._episode_starts[-1][0]
+            record = self.episodes.record(self.episode_count - 1)
+            record["length"] = self.step_count - start
+            # its steps still staged are not in _episode_result yet, the last result of them wins
+            first = start - self._written
+            for row, _, _, _, result, _, _ in reversed(self._outcomes):
+                if row < first:
+                    break
+                if result is not None:
+                    self._episode_result = self._result_code(result)
+                    break
+            record["result"] = self._episode_result
+
+    def flush(self):
+        "writes staged steps and meta.json, everything recorded so far becomes readable"
+        self._write_steps()
+        self._close_episode()
+        self.steps.flush()
+        self.positions.flush()
+        self.episodes.flush()
+        meta = {
+            "steps": self.step_count,
+            "episodes": self.episode_count,
+            "positions": self._positions,
+            "chunk_steps": self.steps.chunk_size,
+            "chunk_episodes": self.episodes.chunk_size,
+            "chunk_positions": self.positions.chunk_size,
+            "layout_path": os.path.abspath(self._base.layout_path),
+            "grid_size": list(self.grid_size),
+            "max_enemies": self.max_enemies,
+            "results": self.results,
+        }
+        with open(os.path.join(self.directory, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+class TrajectoryReader:
+    """Random access to the episodes written by TrajectoryRecorder."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.results = self.meta["results"]
+        self._chunks = {}
+
+    def __len__(self):
+        return self.meta["episodes"]
+
+    def _chunk(self, prefix, index):
+        key = (prefix, index)
+        if key not in self._chunks:
+            path = os.path.join(self.directory, f"{prefix}_{index:05d}.npy")
+            self._chunks[key] = np.load(path, mmap_mode="r")
+        return self._chunks[key]
+
+    def _records(self, prefix, start, stop):
+        # records start..stop-1, read across chunk borders
+        size = self.meta["chunk_" + prefix]
+        parts = []
+        while start < stop:
+            index, offset = divmod(start, size)
+            take = min(stop - start, size - offset)
+            parts.append(self._chunk(prefix, index)[offset:offset + take])
+            start += take
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
+
+    def episode(self, index):
+        "(episode record, its step records)"
+        if not 0 <= index < len(self):
+            raise IndexError(f"episode {index} out of range")
+        episode = self._records("episodes", index, index + 1)[0]
+        start = int(episode["start"])
+        return episode, self._records("steps", start, start + int(episode["length"]))
+
+    def entities(self, step):
+        "(enemy positions, danger positions) after a step record"
+        return self._positions(step["enemy_start"], step["enemy_count"]), self._positions(step["danger_start"], step["danger_count"])
+
+    def _positions(self, start, count):
+        if not count:
+            # a recording without any enemies has no positions files
+            return np.empty((0, 2), dtype=np.int16)
+        return self._records("positions", int(start), int(start) + int(count))
+
+    def result(self, index):
+        episode, _ = self.episode(index)
+        return self.results[episode["result"]]
+
+    def grids(self, index, start=-1, stop=None):
+        "occupancy grids after steps start..stop-1 of an episode, built up step by step"
+        episode, steps = self.episode(index)
+        if stop is None:
+            stop = len(steps)
+        cells = episode["cells"] & ~np.uint8(ENEMY | DANGER)
+        done = steps[:max(start, 0)]
+        for n in np.flatnonzero(done["cleared"]):
+            cells[tuple(done["agent_pos"][n])] &= ~done["cleared"][n]
+        for t in range(start, stop):
+            if t < 0:
+                enemies = episode["enemy_pos"][:episode["enemy_count"]]
+                yield _with_entities(cells, enemies, enemies[:0])
+                continue
+            step = steps[t]
+            if step["cleared"]:
+                cells[tuple(step["agent_pos"])] &= ~step["cleared"]
+            yield _with_entities(cells, *self.entities(step))
+
+    def cells_at(self, index, t):
+        "occupancy grid after step t of an episode, t = -1 is the state right after reset"
+        return next(self.grids(index, t, t + 1))
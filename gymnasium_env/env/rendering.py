@@ -1,16 +1,67 @@
+import os
+import sys
 import pygame
 import numpy as np
 from config import (
-    CELL_SIZE, AGENT_WIDTH, AGENT_HEIGHT, MARGIN, FPS,
+    CELL_SIZE, MARGIN, FPS, AGENT_WIDTH, AGENT_HEIGHT,
     TILE_BASE_COLOR, GRID_LINE_COLOR, GRID_LINE_WIDTH
 )
+from .sprite_atlas import atlas
+from .sprite_cache import SpriteCache, scaled_sizes
+
+# rotation of the agent sprite per facing, the sprite itself looks down
+AGENT_ANGLES = {"up": 180, "down": 0, "left": -90, "right": 90}
+POISON_SCALE = 0.2  # poison pulses between 1 - POISON_SCALE and 1 + POISON_SCALE of its size
+
+# True while the display runs on the dummy driver set up by _init_headless
+_headless_display = False
+
+
+def _init_headless():
+    # SDL_VIDEODRIVER=dummy only for this init, the variable is restored so windows opened later stay real
+    global _headless_display
+    driver = os.environ.get("SDL_VIDEODRIVER")
+    if driver is None:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+    try:
+        pygame.display.init()
+    finally:
+        if driver is None:
+            del os.environ["SDL_VIDEODRIVER"]
+    _headless_display = driver is None
+
+
+def _rgb_frame(surface):
+    "(height, width, 3) uint8 copy of the surface, channels copied once straight out of its pixel buffer"
+    if surface.get_bytesize() != 4:
+        return pygame.surfarray.array3d(surface).transpose(1, 0, 2)
+    width, height = surface.get_size()
+    pixels = np.frombuffer(surface.get_buffer(), dtype=np.uint8).reshape(height, surface.get_pitch() // 4, 4)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    for channel, shift in enumerate(surface.get_shifts()[:3]):
+        byte = shift // 8 if sys.byteorder == "little" else 3 - shift // 8
+        frame[..., channel] = pixels[:, :width, byte]
+    return frame
 
 class GridWorldRenderer:
     def __init__(self, env):
         self.env = env
         self.window = None
+        self.canvas = None
         self.clock = None
         self.font = None
+        self.fps = FPS  # frame rate limit of the human mode window, 0 = none
+        self.events = []  # events of the last human mode frame, for a PlaybackController
+        self.exit_on_quit = True  # closing the window ends the process, off when a PlaybackController handles it
+        self._frames_rendered = 0
+        # floor, grid, goal, walls and rubble, drawn once per episode
+        self._static_layer = None
+        # rects of the current frame drawn over the static layer
+        self._drawn = []
+        # (sprite, position, rect) of the poison and trash of the current frame
+        self._wobbled = []
+        # flipped/scaled textures of walls, rubble and trash
+        self.sprites = SpriteCache()
 
         # Animation
         self.poison_frame_order = [0, 1, 2, 3, 2, 1, 0]
@@ -19,41 +70,80 @@ class GridWorldRenderer:
         self._last_poison_tick = 0
 
     def render(self):
+        human = self.env.render_mode == "human"
+        if self.canvas is None:
+            self._init_canvas(human)
+
+        # Animation frame update
+        now = self._ticks()
+        if now - self._last_poison_tick > self.poison_frame_duration:
+            self.poison_frame_index = (self.poison_frame_index + 1) % len(self.poison_frame_order)
+            self._last_poison_tick = now
+
+        if human:
+            self.events = pygame.event.get()
+            if self.exit_on_quit and any(event.type == pygame.QUIT for event in self.events):
+                pygame.quit()
+                exit()
+
+        changed = self._draw_frame()
+        self._frames_rendered += 1
+
+        if human:
+            if changed is None:
+                pygame.display.flip()
+            else:
+                pygame.display.update(changed)
+            self.clock.tick(self.fps)
+            return None
+
+        # rgb_array: no window and no frame rate limit, frame as (height, width, 3)
+        return _rgb_frame(self.canvas)
+
+    def _init_canvas(self, human):
         rows, cols = self.env.grid_size
         window_width = cols * CELL_SIZE + MARGIN * 2
         window_height = rows * CELL_SIZE + MARGIN * 2
 
-        if self.window is None:
+        if human:
+            global _headless_display
+            if _headless_display and pygame.display.get_init():
+                # an offscreen renderer started the display on the dummy driver, a window needs a real one
+                pygame.display.quit()
+            _headless_display = False
             pygame.init()
             self.window = pygame.display.set_mode((window_width, window_height))
             pygame.display.set_caption("Grid World")
             self.clock = pygame.time.Clock()
-            self.font = pygame.font.SysFont(None, 40)
+            self.canvas = self.window
+        else:
+            # Offscreen surface, a hidden 1x1 display is only needed for convert_alpha
+            if not pygame.display.get_init():
+                _init_headless()
+            pygame.init()
+            if pygame.display.get_surface() is None:
+                pygame.display.set_mode((1, 1), pygame.HIDDEN)
+            self.canvas = pygame.Surface((window_width, window_height))
 
-            
-            self._load_images(window_width, window_height)
+        self.font = pygame.font.SysFont(None, 40)
+        self._load_images(window_width, window_height)
 
-        # Animation frame update
-        now = pygame.time.get_ticks()
-        if now - self._last_poison_tick > self.poison_frame_duration:
-            self.poison_frame_index = (self.poison_frame_index + 1) % len(self.poison_frame_order)
-            self._last_poison_tick = now
+    def _ticks(self):
+        # offscreen frames advance animations by 1/FPS each, so recordings play at render_fps
+        if self.env.render_mode == "human":
+            return pygame.time.get_ticks()
+        return self._frames_rendered * 1000 // FPS
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
+    def reset(self):
+        # the env calls this when the layout or its textures change, the static layer is redrawn on the next frame
+        self._static_layer = None
 
-        self.window.fill((0, 0, 0))
+    def _draw_static_layer(self):
+        self.canvas.fill((0, 0, 0))
         self._draw_base_tiles()
         self._draw_grid()
-
-        for tile in self.env.DMG_TILES:
-            self._draw_poison(tile)
-
-        for tile in self.env.REWARD_TILES:
-            self._draw_trash(tile)
-
+        # every cell has the same floor, cells are rebuilt from it in _cover_static_tiles
+        self._floor_tile = self.canvas.subsurface((MARGIN, MARGIN, CELL_SIZE, CELL_SIZE)).copy()
         self._draw_target_tile(self.env.WIN_TILE)
 
         for tile in self.env.WALL_TILES:
@@ -62,6 +152,30 @@ class GridWorldRenderer:
         for tile in self.env.RUBBLE_TILES:
             self._draw_rubble(tile)
 
+        self._static_layer = self.canvas.copy()
+
+    def _draw_frame(self):
+        "draws the frame on the canvas, returns the rects that differ from the last frame, None when all of it does"
+        # the static layer lies under everything that moves or disappears
+        if self._static_layer is None:
+            self._draw_static_layer()
+            changed = None
+        else:
+            # the canvas still holds the last frame, only what it drew over the static layer is taken back
+            changed = self._drawn
+            for rect in changed:
+                self.canvas.blit(self._static_layer, rect, rect)
+        self._drawn = []
+        self._wobbled = []
+
+        for tile in self.env.DMG_TILES:
+            self._draw_poison(tile)
+
+        for tile in self.env.REWARD_TILES:
+            self._draw_trash(tile)
+
+        self._cover_static_tiles()
+
         for pos in self.env.ENEMY_POSITIONS:
             self._draw_enemy(pos)
 
@@ -73,49 +187,28 @@ class GridWorldRenderer:
 
         self._draw_agent()
         self._draw_step_count()
-        pygame.display.flip()
-        self.clock.tick(FPS)
+        return None if changed is None else changed + self._drawn
 
     def _load_images(self, window_width, window_height):
-        
-        self.agent_image = pygame.image.load("game_sprites/characters/character_main_still.png").convert_alpha()
-        self.agent_image = pygame.transform.scale(self.agent_image, (AGENT_WIDTH, AGENT_HEIGHT))
-
-        self.enemy_image = pygame.image.load("game_sprites/characters/character_enemy.png").convert_alpha()
-        self.enemy_image = pygame.transform.scale(self.enemy_image, (64, 64))
-
-        self.rubble_images = [
-            pygame.transform.scale(pygame.image.load("game_sprites/enviroment/rubble_rocks.png").convert_alpha(), (64, 64)),
-            pygame.transform.scale(pygame.image.load("game_sprites/enviroment/rubble_stone.png").convert_alpha(), (64, 64)),
-            pygame.transform.scale(pygame.image.load("game_sprites/enviroment/rubble_debris.png").convert_alpha(), (64, 64)),
-            pygame.transform.scale(pygame.image.load("game_sprites/enviroment/rubble_barrel.png").convert_alpha(), (64, 64)),
-            pygame.transform.scale(pygame.image.load("game_sprites/enviroment/rubble_crate.png").convert_alpha(), (64, 64))
-        ]
-
-        self.wall_images = [
-            pygame.transform.scale(pygame.image.load("game_sprites/walls/wall_solid.png").convert_alpha(), (64, 64)),
-            pygame.transform.scale(pygame.image.load("game_sprites/walls/wall_cracked.png").convert_alpha(), (64, 64)),
-            pygame.transform.scale(pygame.image.load("game_sprites/walls/wall_destroyed.png").convert_alpha(), (64, 64))
-        ]
-
-        self.poison_frames = [
-            pygame.transform.scale(pygame.image.load("game_sprites/enviroment/poison/poison_1.png").convert_alpha(), (64, 64)),
-            pygame.transform.scale(pygame.image.load("game_sprites/enviroment/poison/poison_2.png").convert_alpha(), (64, 64)),
-            pygame.transform.scale(pygame.image.load("game_sprites/enviroment/poison/poison_3.png").convert_alpha(), (64, 64)),
-            pygame.transform.scale(pygame.image.load("game_sprites/enviroment/poison/poison_4.png").convert_alpha(), (64, 64))
-        ]
-
-        self.trash_images = [
-            pygame.transform.scale(pygame.image.load("game_sprites/enviroment/trash/trash_food.png").convert_alpha(), (48, 48)),
-            pygame.transform.scale(pygame.image.load("game_sprites/enviroment/trash/trash_slime.png").convert_alpha(), (48, 48)),
-            pygame.transform.scale(pygame.image.load("game_sprites/enviroment/trash/trash_cobweb.png").convert_alpha(), (48, 48)),
-            pygame.transform.scale(pygame.image.load("game_sprites/enviroment/trash/trash_skulls.png").convert_alpha(), (48, 48)),
-            pygame.transform.scale(pygame.image.load("game_sprites/enviroment/trash/trash_gold.png").convert_alpha(), (48, 48)),
-            pygame.transform.scale(pygame.image.load("game_sprites/enviroment/trash/trash_chair.png").convert_alpha(), (48, 48))
-        ]
-
-        self.target_image = pygame.image.load("game_sprites/enviroment/staircase_steps.png").convert_alpha()
-        self.target_image = pygame.transform.scale(self.target_image, (64, 64))
+        # subsurfaces of the atlas shared by every renderer of the process
+        sprites = atlas((AGENT_WIDTH, AGENT_HEIGHT))
+        self.agent_image = sprites.sprite("agent")
+        self.enemy_image = sprites.sprite("enemy")
+        self.rubble_images = sprites.group("rubble")
+        self.wall_images = sprites.group("wall")
+        self.poison_frames = sprites.group("poison")
+        self.trash_images = sprites.group("trash")
+        self.target_image = sprites.sprite("target")
+
+        # fixed variants are made here, drawing a frame then runs no transform
+        self.agent_sprites = {
+            facing: pygame.transform.rotate(self.agent_image, angle) for facing, angle in AGENT_ANGLES.items()
+        }
+        self.poison_variants = {
+            (frame_id, size): pygame.transform.smoothscale(frame, size)
+            for frame_id, frame in enumerate(self.poison_frames)
+            for size in scaled_sizes(frame, 1.0 - POISON_SCALE, 1.0 + POISON_SCALE)
+        }
 
     def _draw_base_tiles(self):
         rows, cols = self.env.grid_size
@@ -124,16 +217,16 @@ class GridWorldRenderer:
                 x = MARGIN + c * CELL_SIZE
                 y = MARGIN + r * CELL_SIZE
                 rect = pygame.Rect(x, y, CELL_SIZE, CELL_SIZE)
-                pygame.draw.rect(self.window, TILE_BASE_COLOR, rect)
+                pygame.draw.rect(self.canvas, TILE_BASE_COLOR, rect)
 
     def _draw_grid(self):
         rows, cols = self.env.grid_size
         for i in range(cols + 1):
             x = MARGIN + i * CELL_SIZE
-            pygame.draw.line(self.window, GRID_LINE_COLOR, (x, MARGIN), (x, MARGIN + rows * CELL_SIZE), GRID_LINE_WIDTH)
+            pygame.draw.line(self.canvas, GRID_LINE_COLOR, (x, MARGIN), (x, MARGIN + rows * CELL_SIZE), GRID_LINE_WIDTH)
         for i in range(rows + 1):
             y = MARGIN + i * CELL_SIZE
-            pygame.draw.line(self.window, GRID_LINE_COLOR, (MARGIN, y), (MARGIN + cols * CELL_SIZE, y), GRID_LINE_WIDTH)
+            pygame.draw.line(self.canvas, GRID_LINE_COLOR, (MARGIN, y), (MARGIN + cols * CELL_SIZE, y), GRID_LINE_WIDTH)
 
     def _draw_wall(self, pos):
         x = MARGIN + pos[1] * CELL_SIZE
@@ -141,10 +234,9 @@ class GridWorldRenderer:
         texture_id = self.env.wall_textures_id.get(pos)
         if texture_id is None:
             return
-        texture = self.wall_images[texture_id]
         flip_x, flip_y = self.env.wall_rotations.get(pos, (False, False))
-        texture = pygame.transform.flip(texture, flip_x, flip_y)
-        self.window.blit(texture, (x, y))
+        texture = self.sprites.get(("wall", texture_id), self.wall_images[texture_id], flip_x, flip_y)
+        self.canvas.blit(texture, (x, y))
 
     def _draw_rubble(self, pos):
         x = MARGIN + pos[1] * CELL_SIZE
@@ -152,10 +244,9 @@ class GridWorldRenderer:
         texture_id = self.env.rubble_textures_id.get(pos)
         if texture_id is None:
             return
-        texture = self.rubble_images[texture_id]
         flip_x, flip_y = self.env.rubble_rotations.get(pos, (False, False))
-        texture = pygame.transform.flip(texture, flip_x, flip_y)
-        self.window.blit(texture, (x, y))
+        texture = self.sprites.get(("rubble", texture_id), self.rubble_images[texture_id], flip_x, flip_y)
+        self.canvas.blit(texture, (x, y))
 
     def _draw_trash(self, pos):
         base_x = MARGIN + pos[1] * CELL_SIZE
@@ -163,80 +254,102 @@ class GridWorldRenderer:
         texture_id = self.env.trash_textures_id.get(pos)
         if texture_id is None:
             return
-        texture = self.trash_images[texture_id]
         size = self.env.trash_sizes.get(pos, (48, 48))
-        texture = pygame.transform.smoothscale(texture, size)
         offset_x, offset_y = self.env.trash_offsets.get(pos, (0, 0))
         flip_x, flip_y = self.env.trash_rotations.get(pos, (False, False))
-        texture = pygame.transform.flip(texture, flip_x, flip_y)
+        texture = self.sprites.get(("trash", texture_id), self.trash_images[texture_id], flip_x, flip_y, size)
         center_x = base_x + (CELL_SIZE - size[0]) // 2 + offset_x
         center_y = base_y + (CELL_SIZE - size[1]) // 2 + offset_y
-        self.window.blit(texture, (center_x, center_y))
+        rect = self.canvas.blit(texture, (center_x, center_y))
+        self._drawn.append(rect)
+        self._wobbled.append((texture, (center_x, center_y), rect))
 
     def _draw_poison(self, pos):
         base_x = MARGIN + pos[1] * CELL_SIZE
         base_y = MARGIN + pos[0] * CELL_SIZE
-        t = pygame.time.get_ticks() / 1000
+        t = self._ticks() / 1000
         offset_x = int(2 * np.sin(t + pos[0]))
         offset_y = int(8 * np.cos(t + pos[1]))
-        scale = 1.0 + 0.2 * np.sin(t * 2 + pos[0] + pos[1])
+        scale = 1.0 + POISON_SCALE * np.sin(t * 2 + pos[0] + pos[1])
         frame_id = self.poison_frame_order[self.poison_frame_index]
         frame = self.poison_frames[frame_id]
         new_size = (int(frame.get_width() * scale), int(frame.get_height() * scale))
-        frame = pygame.transform.smoothscale(frame, new_size)
+        frame = self.poison_variants.get((frame_id, new_size)) or self.sprites.get(("poison", frame_id), frame, size=new_size)
         draw_x = base_x + (CELL_SIZE - new_size[0]) // 2 + offset_x
         draw_y = base_y + (CELL_SIZE - new_size[1]) // 2 + offset_y
-        self.window.blit(frame, (draw_x, draw_y))
+        rect = self.canvas.blit(frame, (draw_x, draw_y))
+        self._drawn.append(rect)
+        self._wobbled.append((frame, (draw_x, draw_y), rect))
+
+    def _cover_static_tiles(self):
+        # poison and trash reach into neighbouring cells, but walls, rubble and the goal lie over them.
+        # Such a cell is rebuilt in that order: floor, the sprites reaching into it, its tile
+        env = self.env
+        cells = set()
+        for _, _, rect in self._wobbled:
+            for row in range((rect.top - MARGIN) // CELL_SIZE, (rect.bottom - 1 - MARGIN) // CELL_SIZE + 1):
+                for col in range((rect.left - MARGIN) // CELL_SIZE, (rect.right - 1 - MARGIN) // CELL_SIZE + 1):
+                    cells.add((row, col))
+        for pos in cells:
+            if pos == env.WIN_TILE:
+                draw_tile = self._draw_target_tile
+            elif pos in env.wall_textures_id:
+                draw_tile = self._draw_wall
+            elif pos in env.rubble_textures_id:
+                draw_tile = self._draw_rubble
+            else:
+                continue
+            cell = pygame.Rect(MARGIN + pos[1] * CELL_SIZE, MARGIN + pos[0] * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+            self.canvas.set_clip(cell)
+            self.canvas.blit(self._floor_tile, cell)
+            for sprite, dest, rect in self._wobbled:
+                if rect.colliderect(cell):
+                    self.canvas.blit(sprite, dest)
+            draw_tile(pos)
+        self.canvas.set_clip(None)
 
     def _draw_target_tile(self, pos):
         x = MARGIN + pos[1] * CELL_SIZE
         y = MARGIN + pos[0] * CELL_SIZE
-        self.window.blit(self.target_image, (x, y))
+        self.canvas.blit(self.target_image, (x, y))
 
     def _draw_enemy(self, pos):
         x = MARGIN + pos[1] * CELL_SIZE
         y = MARGIN + pos[0] * CELL_SIZE
-        self.window.blit(self.enemy_image, (x, y))
+        self._drawn.append(self.canvas.blit(self.enemy_image, (x, y)))
 
     def _draw_agent(self):
-        sprite = self.agent_image
-        direction = self.env.agent_facing
-        if direction == "up":
-            angle = 180
-        elif direction == "down":
-            angle = 0
-        elif direction == "left":
-            angle = -90
-        elif direction == "right":
-            angle = 90
-        else:
-            angle = 0
-        sprite = pygame.transform.rotate(sprite, angle)
+        sprite = self.agent_sprites.get(self.env.agent_facing, self.agent_sprites["down"])
         rect = sprite.get_rect()
         x = MARGIN + self.env.agent_pos[1] * CELL_SIZE + (CELL_SIZE - rect.width) // 2
         y = MARGIN + self.env.agent_pos[0] * CELL_SIZE + (CELL_SIZE - rect.height) // 2
-        self.window.blit(sprite, (x, y))
+        self._drawn.append(self.canvas.blit(sprite, (x, y)))
 
     def _draw_step_count(self):
         text = self.font.render(f"Steps: {self.env.step_count}", True, (255, 255, 255))
-        self.window.blit(text, (MARGIN, 20))
+        self._drawn.append(self.canvas.blit(text, (MARGIN, 20)))
 
     def _draw_danger_tile(self, pos):
         x = MARGIN + pos[1] * CELL_SIZE
         y = MARGIN + pos[0] * CELL_SIZE
         surface = pygame.Surface((CELL_SIZE, CELL_SIZE), pygame.SRCALPHA)
         surface.fill((255, 0, 0, 100))
-        self.window.blit(surface, (x, y))
-        pygame.draw.rect(self.window, (255, 0, 0), (x, y, CELL_SIZE, CELL_SIZE), 3)
+        self._drawn.append(self.canvas.blit(surface, (x, y)))
+        pygame.draw.rect(self.canvas, (255, 0, 0), (x, y, CELL_SIZE, CELL_SIZE), 3)
 
     def _draw_attack_tile(self, pos):
         x = MARGIN + pos[1] * CELL_SIZE
         y = MARGIN + pos[0] * CELL_SIZE
         surface = pygame.Surface((CELL_SIZE, CELL_SIZE), pygame.SRCALPHA)
         pygame.draw.rect(surface, (255, 255, 255, 150), surface.get_rect(), 3)
-        self.window.blit(surface, (x, y))
+        self._drawn.append(self.canvas.blit(surface, (x, y)))
 
     def close(self):
-        if self.window:
+        if self.canvas is not None:
             pygame.quit()
             self.window = None
+            self.canvas = None
+            self._static_layer = None
+            self._drawn = []
+            self._wobbled = []
+            self.sprites.clear()
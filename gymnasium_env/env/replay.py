@@ -0,0 +1,183 @@
+import multiprocessing
+import os
+
+import numpy as np
+
+from config import FPS
+from .base_env import GridWorldEnv
+from .recorder import TrajectoryReader
+from .rendering import GridWorldRenderer
+
+
+class ReplayRenderer(GridWorldRenderer):
+    "Offscreen renderer for recorded frames, the poison animation follows the frame number"
+
+    def seek(self, frame):
+        # same cadence as render(), no matter which worker draws the frame
+        step_ms = 1000 // FPS
+        period = (self.poison_frame_duration // step_ms + 1) * step_ms
+        ticks = frame * step_ms
+        self._frames_rendered = frame
+        self.poison_frame_index = ticks // period % len(self.poison_frame_order)
+        self._last_poison_tick = ticks - ticks % period
+
+
+class EpisodeFrames:
+    """Rebuilds the frames of recorded episodes with an offscreen GridWorldEnv.
+
+    Frame 0 is the state after reset and frame t the state after step t. Each
+    recorded state is loaded with set_state and drawn by a ReplayRenderer. The
+    textures of an episode come from reset(seed=seed + episode), so any part of
+    an episode looks the same whichever process draws it.
+    """
+
+    def __init__(self, directory, seed=0):
+        self.reader = TrajectoryReader(directory)
+        self.seed = seed
+        self.env = GridWorldEnv(self.reader.meta["layout_path"], render_mode="rgb_array")
+        self.renderer = self.env.renderer = ReplayRenderer(self.env)
+        self._episode = None
+
+    def _load_episode(self, index):
+        env = self.env
+        episode, _ = self.reader.episode(index)
+        env.reset(seed=self.seed + index)
+        self._state = env.get_state()
+        self._state["cells"] = episode["cells"]
+        self._state["enemy_field_stale"] = True  # frames are only drawn, the enemy field is never needed
+        env.set_state(self._state)
+        # random tiles of the recording can put rewards where this reset drew none, those need textures
+        if any(tile not in env.trash_textures_id for tile in env.REWARD_TILES):
+            for textures in (env.trash_offsets, env.trash_textures_id, env.trash_rotations, env.trash_sizes):
+                textures.clear()
+            env.trash_randomization()
+        self._episode = index
+
+    def render(self, index, start, stop, downsample=1):
+        "frames start..stop-1 of an episode as a (frames, height, width, 3) uint8 array"
+        if index != self._episode:
+            self._load_episode(index)
+        episode, steps = self.reader.episode(index)
+        state = self._state
+        frames = []
+        for frame, cells in enumerate(self.reader.grids(index, start - 1, stop - 1), start):
+            record = episode if frame == 0 else steps[frame - 1]
+            if frame == 0:
+                enemies, danger = record["enemy_pos"][:record["enemy_count"]], record["enemy_pos"][:0]
+            else:
+                enemies, danger = self.reader.entities(record)
+            state["cells"] = cells
+            state["agent_pos"] = record["agent_pos"]
+            state["agent_facing"] = record["agent_facing"]
+            state["counters"][0] = frame  # step count shown in the corner
+            state["enemy_count"] = len(enemies)
+            state["enemy_pos"][:len(enemies)] = enemies
+            state["danger_count"] = len(danger)
+            state["danger_pos"][:len(danger)] = danger
+            state["attack_count"] = 0 if frame == 0 else record["attack_count"]
+            state["attack_highlight"] = 0 if frame == 0 else record["attack_pos"]
+            self.env.set_state(state)
+            self.renderer.seek(frame)
+            frames.append(self.env.render()[::downsample, ::downsample])
+        return np.stack(frames)
+
+    def close(self):
+        self.env.close()
+
+
+class _GifWriter:
+    def __init__(self, path, fps):
+        self.path = path
+        self.duration = 1000 // fps
+        self.images = []
+
+    def write(self, frames):
+        from PIL import Image
+        self.images += [Image.fromarray(frame) for frame in frames]
+
+    def close(self):
+        self.images[0].save(self.path, save_all=True, append_images=self.images[1:], duration=self.duration, loop=0)
+
+
+class _VideoWriter:
+    def __init__(self, path, fps):
+        self.path = path
+        self.fps = fps
+        self.writer = None
+
+    def write(self, frames):
+        import cv2
+        if self.writer is None:
+            height, width = frames.shape[1:3]
+            self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*"mp4v"), self.fps, (width, height))
+        for frame in frames:
+            self.writer.write(np.ascontiguousarray(frame[..., ::-1]))  # RGB -> BGR
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+
+
+_worker = None
+
+
+def _init_worker(directory, seed):
+    global _worker
+    _worker = EpisodeFrames(directory, seed)
+
+
+def _render_task(task):
+    return task[0], _worker.render(*task)
+
+
+def replay_episodes(
+    directory, episodes=None, out_dir="replays", fmt="mp4", fps=FPS, workers=None, frames_per_task=32,
+    downsample=1, seed=0
+):
+    """Renders recorded episodes to one video or GIF each, returns the written paths.
+
+    directory is a TrajectoryRecorder recording, episodes its episode indices (all
+    by default). Every episode is cut into tasks of frames_per_task frames that a
+    process pool renders offscreen, the frames come back in order and go straight
+    to the encoder: fmt "gif" needs pillow, anything else is written by opencv as
+    mp4v. downsample keeps every n-th pixel row and column.
+    """
+    reader = TrajectoryReader(directory)
+    if episodes is None:
+        episodes = range(len(reader))
+    tasks = []
+    for index in episodes:
+        _, steps = reader.episode(index)
+        frames = len(steps) + 1
+        tasks += [(index, start, min(start + frames_per_task, frames), downsample) for start in range(0, frames, frames_per_task)]
+
+    os.makedirs(out_dir, exist_ok=True)
+    writer_type = _GifWriter if fmt == "gif" else _VideoWriter
+    paths = []
+    writer = current = None
+
+    if workers == 1:
+        _init_worker(directory, seed)
+        results = map(_render_task, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(directory, seed))
+        results = pool.imap(_render_task, tasks)
+    try:
+        for index, frames in results:
+            if index != current:
+                if writer is not None:
+                    writer.close()
+                paths.append(os.path.join(out_dir, f"episode_{index:05d}.{fmt}"))
+                writer = writer_type(paths[-1], fps)
+                current = index
+            writer.write(frames)
+        if writer is not None:
+            writer.close()
+    finally:
+        if pool is None:
+            _worker.close()
+        else:
+            pool.close()
+            pool.join()
+    return paths
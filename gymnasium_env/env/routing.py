@@ -0,0 +1,173 @@
+import numpy as np
+
+UNREACHABLE = 2 ** 30
+
+
+class DistanceField:
+    """BFS distance from every cell to its nearest source, patched incrementally.
+
+    Cells are stored flat on the grid padded by one blocked border, so the
+    neighbours of index i are i + offsets without bounds checks. The offsets
+    follow the low level actions (up, down, left, right), which makes
+    direction() pick the same first step as a BFS expanding in that order.
+    """
+
+    def __init__(self, passable):
+        rows, cols = passable.shape
+        self.shape = (rows, cols)
+        self.width = cols + 2
+        self.offsets = np.array([-self.width, self.width, -1, 1])
+
+        padded = np.zeros((rows + 2, cols + 2), dtype=bool)
+        padded[1:-1, 1:-1] = passable
+        self.passable = padded.ravel()
+        self.dist = np.full(self.passable.shape, UNREACHABLE, dtype=np.int64)
+        self.is_source = np.zeros(self.passable.shape, dtype=bool)
+        # cells settled by the BFS waves so far, a measure of routing work
+        self.expansions = 0
+
+    def copy(self):
+        field = DistanceField.__new__(DistanceField)
+        field.shape = self.shape
+        field.width = self.width
+        field.offsets = self.offsets
+        field.passable = self.passable.copy()
+        field.dist = self.dist.copy()
+        field.is_source = self.is_source.copy()
+        field.expansions = 0
+        return field
+
+    def index(self, positions):
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        return np.unique((positions[:, 0] + 1) * self.width + positions[:, 1] + 1)
+
+    def set_sources(self, positions):
+        self.dist[:] = UNREACHABLE
+        self.is_source[:] = False
+        self.add_sources(positions)
+
+    def add_sources(self, positions):
+        nodes = self.index(positions)
+        nodes = nodes[self.passable[nodes] & ~self.is_source[nodes]]
+        self.is_source[nodes] = True
+        self._propagate(nodes, np.zeros(len(nodes), dtype=np.int64))
+
+    def remove_sources(self, positions):
+        nodes = self.index(positions)
+        nodes = nodes[self.is_source[nodes]]
+        self.is_source[nodes] = False
+        self._repair(nodes)
+
+    def block(self, positions):
+        # a blocked cell can't be entered, sources on it are dropped
+        nodes = self.index(positions)
+        nodes = nodes[self.passable[nodes]]
+        self.passable[nodes] = False
+        self.is_source[nodes] = False
+        self._repair(nodes)
+
+    def unblock(self, positions):
+        nodes = self.index(positions)
+        nodes = nodes[~self.passable[nodes]]
+        self.passable[nodes] = True
+        reach = self.dist[nodes[:, None] + self.offsets].min(axis=1) + 1
+        reachable = reach < UNREACHABLE
+        self._propagate(nodes[reachable], reach[reachable])
+
+    def distance(self, pos):
+        dist = self.dist[(pos[0] + 1) * self.width + pos[1] + 1]
+        return None if dist >= UNREACHABLE else int(dist)
+
+    def direction(self, pos):
+        # first action (0-3) that gets closer to a source, None if there is none
+        index = (pos[0] + 1) * self.width + pos[1] + 1
+        if self.is_source[index]:
+            return None
+        around = self.dist[index + self.offsets]
+        best = around.argmin()
+        if around[best] >= UNREACHABLE:
+            return None
+        return int(best)
+
+    def _propagate(self, nodes, values):
+        # Lowers distances from nodes with tentative values, one BFS level at a time
+        if not len(nodes):
+            return
+        dist = self.dist
+        order = np.argsort(values, kind="stable")
+        nodes, values = nodes[order], values[order]
+
+        level = values[0]
+        start = 0
+        frontier = nodes[:0]
+        while True:
+            end = np.searchsorted(values, level, side="right")
+            seeds = nodes[start:end]
+            start = end
+            seeds = seeds[dist[seeds] > level]
+            if len(seeds):
+                self.expansions += len(seeds)
+                dist[seeds] = level
+                frontier = np.concatenate((frontier, seeds))
+
+            if not len(frontier):
+                if start == len(nodes):
+                    break
+                level = values[start]
+                continue
+
+            neighbours = (frontier[:, None] + self.offsets).ravel()
+            neighbours = neighbours[self.passable[neighbours] & (dist[neighbours] > level + 1)]
+            frontier = np.unique(neighbours)
+            self.expansions += len(frontier)
+            dist[frontier] = level + 1
+            level += 1
+
+    def _repair(self, nodes):
+        # Distances can only grow here: find every cell whose shortest paths all
+        # ran through nodes, forget them and rebuild from the cells around them
+        dist = self.dist
+        nodes = nodes[dist[nodes] < UNREACHABLE]
+        if not len(nodes):
+            return
+        offsets = self.offsets
+
+        affected = np.zeros(dist.shape, dtype=bool)
+        affected[nodes] = True
+        order = np.argsort(dist[nodes], kind="stable")
+        nodes = nodes[order]
+        levels = dist[nodes]
+
+        region = []
+        level = levels[0]
+        start = 0
+        layer = nodes[:0]
+        while True:
+            end = np.searchsorted(levels, level, side="right")
+            layer = np.concatenate((layer, nodes[start:end]))
+            start = end
+            if not len(layer):
+                if start == len(nodes):
+                    break
+                level = levels[start]
+                continue
+            region.append(layer)
+
+            children = (layer[:, None] + offsets).ravel()
+            children = np.unique(children[(dist[children] == level + 1) & ~affected[children]])
+            if len(children):
+                # a child keeps its distance if an unaffected neighbour is still one step closer
+                around = children[:, None] + offsets
+                supported = ((dist[around] == level) & ~affected[around] & self.passable[around]).any(axis=1)
+                children = children[~supported]
+                affected[children] = True
+            layer = children
+            level += 1
+
+        region = np.concatenate(region)
+        self.expansions += len(region)
+        dist[region] = UNREACHABLE
+        region = region[self.passable[region]]
+        reach = dist[region[:, None] + offsets].min(axis=1) + 1
+        reachable = reach < UNREACHABLE
+        self._propagate(region[reachable], reach[reachable])
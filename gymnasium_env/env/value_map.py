@@ -0,0 +1,106 @@
+import hashlib
+import os
+
+import matplotlib.pyplot as plt
+import numpy as np
+import torch
+
+from .occupancy import AGENT_BLOCKERS, OBS_LUT
+
+CACHE_DIR = ".value_map_cache"
+
+# file digests keyed by (path, mtime, size), a model is hashed once per process
+_DIGESTS = {}
+
+
+def file_digest(path):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _DIGESTS:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _DIGESTS[key] = digest.hexdigest()
+    return _DIGESTS[key]
+
+
+def probe_observations(grid_size, cells=None):
+    """Observations with the agent put on every probed cell, (probes, rows * cols), and the probed cells.
+
+    Without cells the agent stands alone on an empty grid and every cell is
+    probed, as the old test_ppo.py heatmap did. With the occupancy grid of a
+    real state the rest of the map is kept and only cells the agent can stand
+    on are probed.
+    """
+    rows, cols = grid_size
+    if cells is None:
+        background = np.zeros(rows * cols, dtype=np.float32)
+        probed = np.arange(rows * cols)
+    else:
+        background = OBS_LUT[cells].ravel()
+        probed = np.flatnonzero((cells & AGENT_BLOCKERS).ravel() == 0)
+    obs = np.repeat(background[None], len(probed), axis=0)
+    obs[np.arange(len(probed)), probed] = 1.0  # agent
+    return obs, probed
+
+
+def value_map(model, model_path, layout_path, grid_size, cells=None, cache_dir=CACHE_DIR):
+    """V(s) of the model with the agent on each cell as a (rows, cols) array, NaN where not probed.
+
+    All probe observations go through predict_values in one batch. Results are
+    cached in cache_dir under the hashes of the model file, the layout file and,
+    with context, the probed occupancy grid, so repeated runs skip the model.
+    cache_dir=None turns the cache off.
+    """
+    key = hashlib.sha256()
+    key.update(file_digest(model_path).encode())
+    key.update(file_digest(layout_path).encode())
+    if cells is not None:
+        key.update(np.ascontiguousarray(cells).tobytes())
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, key.hexdigest() + ".npy")
+        if os.path.exists(path):
+            return np.load(path)
+
+    obs, probed = probe_observations(grid_size, cells)
+    obs_tensor, _ = model.policy.obs_to_tensor(obs)
+    with torch.no_grad():
+        values = model.policy.predict_values(obs_tensor).cpu().numpy().ravel()
+    result = np.full(grid_size, np.nan, dtype=np.float32)
+    result.flat[probed] = values
+
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(path, result)
+    return result
+
+
+def plot_value_map(values, path, title="Agent's State-Value Heatmap", annotate=None):
+    """Saves the value map as a heatmap image.
+
+    Values are written into the cells when annotate is true, by default only up
+    to 400 cells, where they are still readable.
+    """
+    rows, cols = values.shape
+    if annotate is None:
+        annotate = rows * cols <= 400
+    # 0.7 inch per cell as before, big maps are scaled down to 20 inches
+    scale = min(0.7, 20 / max(rows, cols))
+    fig, ax = plt.subplots(figsize=(max(cols * scale, 4), max(rows * scale, 3)))
+    im = ax.imshow(values, cmap="viridis")
+    fig.colorbar(im, ax=ax, label="V(s) predicted by agent")
+    ax.set_title(title)
+
+    if annotate:
+        for (i, j), value in np.ndenumerate(values):
+            if not np.isnan(value):
+                ax.text(j, i, f"{value:.2f}", ha="center", va="center", color="white", fontsize=8)
+
+    if cols <= 50 and rows <= 50:
+        ax.set_xticks(np.arange(cols))
+        ax.set_yticks(np.arange(rows))
+    ax.grid(False)
+    fig.savefig(path, dpi=150)
+    plt.close(fig)
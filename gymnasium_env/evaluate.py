@@ -0,0 +1,111 @@
+"""Headless evaluation of a saved PPO model, episodes run in parallel processes.
+
+Replaces the episode loop of test_ppo.py (no rendering, no sleep). The presets are
+the model/map/reset option combinations listed in test_ppo.py:
+
+    python evaluate.py --preset random_big --episodes 500
+    python evaluate.py --model final_models/ppo_gridworld_maze_low_level_mlp.zip \\
+        --layout level_layouts/level_maze.txt --force-furthest --low-level --omit-step-penalty
+
+Prints success/death/timeout/stuck/oscillation rates and mean steps and reward with
+95% confidence intervals, --output also writes them and every episode as JSON.
+"""
+import argparse
+import json
+import os
+import time
+
+from stable_baselines3 import PPO
+
+from env.evaluation import OUTCOME_NAMES, run_episodes, summarize
+
+# model, layout and reset options as in test_ppo.py
+PRESETS = {
+    "random_small_high": (
+        "final_models/ppo_gridworld_random_small_high_level_mlp.zip", "level_layouts/level_random_small.txt",
+        {"force_furthest": False, "test_emptiness": 0.2},
+    ),
+    "random_small_low": (
+        "final_models/ppo_gridworld_random_small_low_level_mlp.zip", "level_layouts/level_random_small.txt",
+        {"force_furthest": False, "test_emptiness": 0.2, "use_low_level_actions": True},
+    ),
+    "arena": (
+        "final_models/ppo_gridworld_arena_low_level_mlp.zip", "level_layouts/level_arena.txt",
+        {"force_furthest": False, "use_low_level_actions": True},
+    ),
+    "maze": (
+        "final_models/ppo_gridworld_maze_low_level_mlp.zip", "level_layouts/level_maze.txt",
+        {"force_furthest": True, "use_low_level_actions": True, "omit_step_penalty": True},
+    ),
+    "random_big": (
+        "final_models/ppo_gridworld_random_partial_mlp.zip", "level_layouts/level_random_big.txt",
+        {"force_furthest": False, "test_emptiness": 0.2},
+    ),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="random_big")
+    parser.add_argument("--model", help="overrides the model of the preset")
+    parser.add_argument("--layout", help="overrides the layout of the preset")
+    parser.add_argument("--force-furthest", action="store_true", default=None)
+    parser.add_argument("--test-emptiness", type=float, default=None)
+    parser.add_argument("--low-level", dest="use_low_level_actions", action="store_true", default=None)
+    parser.add_argument("--omit-step-penalty", action="store_true", default=None)
+    parser.add_argument("--episodes", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stochastic", action="store_true", help="sample actions instead of deterministic=True")
+    parser.add_argument("--maskable", action="store_true", help="MaskablePPO model (sb3-contrib), predicts with action masks")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--output", help="JSON file for the summary and every episode")
+    args = parser.parse_args()
+
+    model_path, layout_path, reset_kwargs = PRESETS[args.preset]
+    model_path = args.model or model_path
+    layout_path = args.layout or layout_path
+    reset_kwargs = dict(reset_kwargs)
+    for key in ("force_furthest", "test_emptiness", "use_low_level_actions", "omit_step_penalty"):
+        if getattr(args, key) is not None:
+            reset_kwargs[key] = getattr(args, key)
+
+    model_type = PPO
+    if args.maskable:
+        from sb3_contrib import MaskablePPO as model_type
+    model = model_type.load(model_path, device=args.device)
+
+    start = time.perf_counter()
+    results = run_episodes(
+        model, layout_path, episodes=args.episodes, workers=args.workers, reset_kwargs=reset_kwargs,
+        seed=args.seed, deterministic=not args.stochastic, use_masks=args.maskable,
+    )
+    elapsed = time.perf_counter() - start
+    summary = summarize(results)
+
+    print(f"{model_path} on {layout_path} {reset_kwargs}")
+    print(f"{len(results)} episodes on {args.workers} workers in {elapsed:.1f}s")
+    for name in OUTCOME_NAMES:
+        rate, low, high = summary["rates"][name]
+        print(f"{name:12s} {rate:7.1%}  [{low:6.1%}, {high:6.1%}]")
+    for key in ("steps", "reward"):
+        mean, low, high = summary[key]
+        print(f"mean {key:7s} {mean:9.2f}  [{low:.2f}, {high:.2f}]")
+
+    if args.output:
+        report = {
+            "model": model_path,
+            "layout": layout_path,
+            "reset_kwargs": reset_kwargs,
+            "seed": args.seed,
+            "deterministic": not args.stochastic,
+            "summary": summary,
+            "episodes": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
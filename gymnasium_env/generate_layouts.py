@@ -0,0 +1,48 @@
+"""Writes procedurally generated layouts into a folder, see env/layout_generator.py.
+
+    python generate_layouts.py --count 1000 --size 128 --out generated_layouts
+"""
+import argparse
+import os
+import time
+
+from env.layout_generator import generate_layouts, save_layout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--size", type=int, nargs="+", default=[128], help="side of a square map, or rows cols")
+    parser.add_argument("--out", default="generated_layouts")
+    parser.add_argument("--prefix", default="generated")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, all cores by default")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--wall-density", type=float, default=0.2)
+    parser.add_argument("--rubble", type=int, default=0)
+    parser.add_argument("--poison", type=int, default=0)
+    parser.add_argument("--rewards", type=int, default=0)
+    parser.add_argument("--enemies", type=int, default=0)
+    parser.add_argument("--random-tiles", type=int, default=0)
+    parser.add_argument("--starts", type=int, default=4)
+    parser.add_argument("--min-start-distance", type=int, default=0, help="min Manhattan distance of a start to the goal")
+    parser.add_argument("--max-start-distance", type=int, default=None)
+    args = parser.parse_args()
+
+    size = args.size[0] if len(args.size) == 1 else tuple(args.size[:2])
+    start = time.perf_counter()
+    layouts = generate_layouts(
+        args.count, workers=args.workers, seed=args.seed, size=size,
+        wall_density=args.wall_density, rubble=args.rubble, poison=args.poison, rewards=args.rewards,
+        enemies=args.enemies, random_tiles=args.random_tiles, starts=args.starts,
+        min_start_distance=args.min_start_distance, max_start_distance=args.max_start_distance,
+    )
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(args.out, exist_ok=True)
+    for i, layout in enumerate(layouts):
+        save_layout(os.path.join(args.out, f"{args.prefix}_{i:05d}.txt"), layout)
+    print(f"{len(layouts)} layouts in {elapsed:.2f}s ({len(layouts) / elapsed:.0f}/s) written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
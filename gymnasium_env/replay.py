@@ -0,0 +1,44 @@
+"""Renders episodes recorded by env/recorder.py (TrajectoryRecorder) to videos or GIFs offline.
+
+    python replay.py recordings/run1 --episodes 0 5 12 --format gif --out replays
+
+Frames are drawn offscreen in a process pool, see env/replay.py. mp4 needs opencv,
+gif needs pillow (both come with stable-baselines3[extra]).
+"""
+import argparse
+import time
+
+from config import FPS
+from env.recorder import TrajectoryReader
+from env.replay import replay_episodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="directory written by TrajectoryRecorder")
+    parser.add_argument("--episodes", type=int, nargs="*", default=None, help="episode indices, all by default")
+    parser.add_argument("--last", type=int, default=None, help="only the last n recorded episodes")
+    parser.add_argument("--out", default="replays")
+    parser.add_argument("--format", default="mp4", choices=["mp4", "gif"])
+    parser.add_argument("--fps", type=int, default=FPS)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, all cores by default")
+    parser.add_argument("--frames-per-task", type=int, default=32)
+    parser.add_argument("--downsample", type=int, default=1, help="keep every n-th pixel row and column")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random textures")
+    args = parser.parse_args()
+
+    episodes = args.episodes
+    if args.last is not None:
+        count = len(TrajectoryReader(args.recording))
+        episodes = range(max(count - args.last, 0), count)
+
+    start = time.perf_counter()
+    paths = replay_episodes(
+        args.recording, episodes, out_dir=args.out, fmt=args.format, fps=args.fps, workers=args.workers,
+        frames_per_task=args.frames_per_task, downsample=args.downsample, seed=args.seed,
+    )
+    print(f"{len(paths)} episodes in {time.perf_counter() - start:.2f}s written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,9 @@
 from env import GridWorldEnv
+from env.playback import PlaybackController
+from env.value_map import value_map as compute_value_map, plot_value_map
 from stable_baselines3 import PPO
-import torch
 import numpy as np
-import matplotlib.pyplot as plt
 from stable_baselines3.common.monitor import Monitor
-import time
 
 log_path = "run_log.txt"
 """
@@ -38,6 +37,14 @@ max_steps = 100
 heatmapnotsaved = True  # Set this to False to skip heatmap
 rewardTotal = 0
 
+"""
+přehrávání - speed = kroky za sekundu (None = bez omezení), render_every = vykresli jen každý k-tý krok,
+display_fps = simulace běží naplno a okno jen display_fps krát za sekundu ukáže aktuální stav
+ovládání v okně: mezerník pauza, šipka vpravo / n jeden krok v pauze, šipky nahoru/dolů 2x rychleji/pomaleji,
+u vypne/zapne omezení rychlosti, esc ukončí test
+"""
+playback = PlaybackController(env, speed=1 / 0.3, render_every=1, display_fps=None)
+
 with open(log_path, "w") as log:
     for episode in range(num_episodes):
         print(f"\n Episode {episode + 1}")
@@ -67,13 +74,15 @@ with open(log_path, "w") as log:
         rewardTotal = 0
 
         while not done:
-            env.render()
-            time.sleep(0.3) #zpomalení přehrání
+            if not playback.tick():
+                break
             action, _ = model.predict(obs, deterministic=True)
             obs, reward, terminated, truncated, info = env.step(action)
             rewardTotal += reward
             done = terminated or truncated
             steps += 1
+        if playback.stopped:
+            break
             
 
         # Determine outcome
@@ -94,40 +103,14 @@ with open(log_path, "w") as log:
         print(msg)
         log.write(msg + "\n")
 
-        # Generate heatmap only once
+        # Generate heatmap only once (batched and cached, see env/value_map.py and value_map.py)
         if heatmapnotsaved:
-            base_env = env.unwrapped  
-            rows, cols = base_env.grid_size
-            value_map = np.zeros((rows, cols))
-
             rows, cols = env.unwrapped.grid_size
             obs_grid = obs.reshape((rows, cols))
             print("Agent observation (as grid):\n", obs_grid)
 
-            for i in range(rows):
-                for j in range(cols):
-                    test_grid = np.zeros((rows, cols), dtype=np.float32)
-                    test_grid[i, j] = 1.0
-                    test_obs = test_grid.flatten().reshape(1, -1)
-                    test_tensor = torch.tensor(test_obs, dtype=torch.float32).to(model.device)
-                    with torch.no_grad():
-                        value = model.policy.predict_values(test_tensor).cpu().numpy().item()
-                    value_map[i, j] = value
-
-            # Plot heatmap
-            plt.figure(figsize=(cols * 0.7, rows * 0.7))
-            im = plt.imshow(value_map, cmap='viridis')
-            plt.colorbar(im, label='V(s) predicted by agent')
-            plt.title("Agent's State-Value Heatmap")
-
-            for i in range(rows):
-                for j in range(cols):
-                    plt.text(j, i, f"{value_map[i, j]:.2f}", ha='center', va='center', color='white', fontsize=8)
-
-            plt.xticks(np.arange(cols))
-            plt.yticks(np.arange(rows))
-            plt.grid(False)
-            plt.savefig("value_map.png", dpi=150)
+            value_map = compute_value_map(model, model_path, layout_path, (rows, cols))
+            plot_value_map(value_map, "value_map.png")
             print("Saved value heatmap as value_map.png")
             heatmapnotsaved = False
 
@@ -3,6 +3,10 @@ from stable_baselines3.common.monitor import Monitor
 from stable_baselines3.common.env_checker import check_env
 from env import GridWorldEnv
 
+# MaskablePPO (pip install sb3-contrib) trénuje jen s akcemi z env.action_masks(), bez zbytečných akcí
+USE_ACTION_MASKS = False
+if USE_ACTION_MASKS:
+    from sb3_contrib import MaskablePPO as PPO
 
 
 check_env(GridWorldEnv(layout_path="level_layouts/level_random_small.txt"), warn=True) #kontrola zdali odpovídá formátu gymnasia
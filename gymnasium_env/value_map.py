@@ -0,0 +1,55 @@
+"""Value-function heatmap of a saved PPO model, see env/value_map.py.
+
+    python value_map.py --preset random_big
+    python value_map.py --preset arena --context --seed 3 --out arena_values.png
+
+Without --context the agent is probed alone on an empty grid (as test_ppo.py did),
+with --context inside the map state after reset(seed) with the preset's reset
+options. Results are cached per model file, layout and probed state.
+"""
+import argparse
+import time
+
+from stable_baselines3 import PPO
+
+from env import GridWorldEnv
+from env.value_map import CACHE_DIR, plot_value_map, value_map
+from evaluate import PRESETS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="random_big")
+    parser.add_argument("--model", help="overrides the model of the preset")
+    parser.add_argument("--layout", help="overrides the layout of the preset")
+    parser.add_argument("--context", action="store_true", help="probe inside a real map state instead of an empty grid")
+    parser.add_argument("--seed", type=int, default=0, help="reset seed of the --context state")
+    parser.add_argument("--out", default="value_map.png")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    model_path, layout_path, reset_kwargs = PRESETS[args.preset]
+    model_path = args.model or model_path
+    layout_path = args.layout or layout_path
+
+    env = GridWorldEnv(layout_path, render_mode="rgb_array")
+    cells = None
+    if args.context:
+        env.reset(seed=args.seed, **reset_kwargs)
+        cells = env.cells.copy()
+
+    start = time.perf_counter()
+    model = PPO.load(model_path, device=args.device)
+    values = value_map(
+        model, model_path, layout_path, env.grid_size, cells=cells,
+        cache_dir=None if args.no_cache else args.cache_dir,
+    )
+    print(f"value map of {model_path} on {layout_path} in {time.perf_counter() - start:.2f}s")
+    plot_value_map(values, args.out)
+    print(f"Saved value heatmap as {args.out}")
+
+
+if __name__ == "__main__":
+    main()